@@ -6,8 +6,14 @@ from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
 
+from src.api.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
 from src.api.routes import api_router
-from src.database import get_database_mode, init_db
+from src.database import DB_POOL_SATURATION_WARN, dispose_engines, get_database_mode, init_db, pool_stats
+from src.services.gemini_client import close_client, init_client
+from src.services.gemini_test_service import warm_model_registry
+from src.services.password_hashing import password_hasher
+from src.services.prompt_queue import prompt_queue
+from src.services.usage_stats import usage_stats
 
 app = FastAPI(title="TaskMate backend", version="0.1.0")
 
@@ -21,17 +27,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER],
 )
 
 
 @app.on_event("startup")
 def on_startup() -> None:
     init_db()
+    init_client()
+    warm_model_registry()
+    prompt_queue.start()
+    usage_stats.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    prompt_queue.stop()
+    usage_stats.stop()
+    password_hasher.shutdown()
+    await close_client()
+    await dispose_engines()
 
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "database": get_database_mode()}
+    pool = pool_stats()
+    saturation = max(pool.get("saturation", 0.0), pool.get("background", {}).get("saturation", 0.0))
+    saturated = saturation >= DB_POOL_SATURATION_WARN
+    return {
+        "status": "degraded" if saturated else "ok",
+        "database": get_database_mode(),
+        "pool": pool,
+    }
 
 
 @app.get("/")
@@ -0,0 +1,150 @@
+"""
+Compares polling throughput with the authenticated-user cache off and on.
+
+Each run is its own process (the cache setting is read at import time) against
+a throwaway SQLite database, driving the ASGI app in-process over httpx and
+alternating GET /api/auth/me with GET /api/results/{id}:
+
+    python backend/benchmarks/auth_cache.py --requests 4000 --concurrency 100
+
+Pass --db-mode sync to measure with DB_ASYNC_MODE=false, where every lookup
+also costs a threadpool hop.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ENDPOINTS = ("me", "result")
+
+
+async def _drive(requests: int, concurrency: int, users: int) -> dict:
+    import httpx
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app import app
+    from src.database import SessionLocal, dispose_engines, init_db
+    from src.models import Prompt
+    from src.services.user_cache import user_cache
+
+    init_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        pollers = []
+        for index in range(users):
+            response = await client.post(
+                "/api/auth/register",
+                json={"name": "Bench", "email": f"bench-{os.getpid()}-{index}@example.com", "password": "bench-password"},
+            )
+            response.raise_for_status()
+            body = response.json()
+            with SessionLocal() as db:
+                prompt = Prompt(
+                    user_id=body["user"]["id"],
+                    prompt_text="bench prompt",
+                    response_text="bench response",
+                    status="completed",
+                    created_at=datetime.utcnow(),
+                )
+                db.add(prompt)
+                db.commit()
+                pollers.append(({"Authorization": f"Bearer {body['token']}"}, prompt.id))
+
+        latencies = {name: [] for name in ENDPOINTS}
+        errors = 0
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> None:
+            nonlocal errors
+            headers, prompt_id = pollers[index % len(pollers)]
+            name = ENDPOINTS[index % len(ENDPOINTS)]
+            path = "/api/auth/me" if name == "me" else f"/api/results/{prompt_id}"
+            async with gate:
+                started = time.perf_counter()
+                result = await client.get(path, headers=headers)
+                latencies[name].append(time.perf_counter() - started)
+                if result.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    await dispose_engines()
+    per_endpoint = {}
+    for name, samples in latencies.items():
+        samples.sort()
+        per_endpoint[name] = {
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+            "p99_ms": round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 2),
+        }
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "endpoints": per_endpoint,
+        "cache": user_cache.stats(),
+    }
+
+
+def _run(cache_enabled: bool, args: argparse.Namespace) -> dict:
+    env = dict(
+        os.environ,
+        AUTH_USER_CACHE_ENABLED="true" if cache_enabled else "false",
+        AUTH_LIMIT_ENABLED="false",
+        DB_ASYNC_MODE="true" if args.db_mode == "async" else "false",
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                "--requests", str(args.requests),
+                "--concurrency", str(args.concurrency),
+                "--users", str(args.users),
+            ],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20, help="distinct polling users")
+    parser.add_argument("--db-mode", choices=("async", "sync"), default="async")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_drive(args.requests, args.concurrency, args.users))))
+        return
+
+    for cache_enabled in (False, True):
+        result = _run(cache_enabled, args)
+        me, polled = result["endpoints"]["me"], result["endpoints"]["result"]
+        print(
+            f"cache {'on ' if cache_enabled else 'off'}: {result['requests_per_second']:>8} req/s  "
+            f"/me p50 {me['p50_ms']} ms  /results p50 {polled['p50_ms']} ms  "
+            f"hit rate {result['cache']['hit_rate']}  errors {result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
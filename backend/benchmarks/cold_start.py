@@ -0,0 +1,66 @@
+"""
+Times init_db() in fresh processes against an already-initialised database,
+which is what every worker pays on a restart:
+
+    python backend/benchmarks/cold_start.py --runs 10
+
+Uses a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _child() -> None:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from src.database import init_db
+
+    started = time.perf_counter()
+    init_db()
+    print((time.perf_counter() - started) * 1000)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_ASYNC_MODE="false")
+        env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/cold.db")
+
+        def run_once() -> float:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child"],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            return float(output.strip().splitlines()[-1])
+
+        first = run_once()
+        warm = [run_once() for _ in range(args.runs)]
+
+    print(f"first start (creates schema): {first:.1f} ms")
+    print(
+        f"restart, {args.runs} runs: median {statistics.median(warm):.1f} ms, "
+        f"min {min(warm):.1f} ms, max {max(warm):.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
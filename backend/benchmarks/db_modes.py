@@ -0,0 +1,126 @@
+"""
+Compares request throughput with DB_ASYNC_MODE on and off.
+
+Each mode runs in its own process (the mode is read at import time) against a
+throwaway SQLite database, driving the ASGI app in-process over httpx:
+
+    python backend/benchmarks/db_modes.py --requests 2000 --concurrency 200
+
+Set DATABASE_URL to benchmark against MySQL instead; the tables are shared
+between runs, so use a scratch database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+async def _drive(requests: int, concurrency: int, write_ratio: float) -> dict:
+    import httpx
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app import app
+    from src.database import dispose_engines, init_db
+
+    init_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        email = f"bench-{os.getpid()}@example.com"
+        response = await client.post(
+            "/api/auth/register",
+            json={"name": "Bench", "email": email, "password": "bench-password"},
+        )
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        for index in range(20):
+            await client.post("/api/sessions", json={"title": f"seed {index}"}, headers=headers)
+
+        latencies: list[float] = []
+        errors = 0
+        gate = asyncio.Semaphore(concurrency)
+        rng = random.Random(7)
+        plan = [rng.random() < write_ratio for _ in range(requests)]
+
+        async def one(is_write: bool) -> None:
+            nonlocal errors
+            async with gate:
+                started = time.perf_counter()
+                if is_write:
+                    result = await client.post("/api/sessions", json={"title": "bench"}, headers=headers)
+                else:
+                    result = await client.get("/api/sessions", headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if result.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(is_write) for is_write in plan))
+        elapsed = time.perf_counter() - started
+
+    await dispose_engines()
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def _run_mode(mode: str, args: argparse.Namespace) -> dict:
+    env = dict(os.environ, DB_ASYNC_MODE="true" if mode == "async" else "false")
+    with tempfile.TemporaryDirectory() as tmp:
+        env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                "--requests", str(args.requests),
+                "--concurrency", str(args.concurrency),
+                "--write-ratio", str(args.write_ratio),
+            ],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_drive(args.requests, args.concurrency, args.write_ratio))))
+        return
+
+    for mode in ("sync", "async"):
+        result = _run_mode(mode, args)
+        print(
+            f"{mode:>5}: {result['requests_per_second']:>8} req/s  "
+            f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  "
+            f"errors {result['errors']}  ({result['requests']} requests, "
+            f"concurrency {result['concurrency']})"
+        )
+
+
+if __name__ == "__main__":
+    main()
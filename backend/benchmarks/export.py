@@ -0,0 +1,159 @@
+"""
+Measures the admin prompt export against a large seeded SQLite database:
+rows per second seen by the client and the server's peak RSS.
+
+    python backend/benchmarks/export.py --rows 2000000 --format csv --gzip
+
+The server runs under uvicorn in a subprocess so its memory is measured on
+its own (VmHWM from /proc, so Linux only). SQLite's memory-mapped pages
+count towards RSS, so run with SQLITE_MMAP_SIZE=0 to measure the export
+itself rather than the mapped database file.
+"""
+import argparse
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ADMIN_EMAIL = "export-admin@example.com"
+ADMIN_PASSWORD = "export-admin-password"
+
+
+def _seed(db_path: str, rows: int, users: int) -> None:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", DB_ASYNC_MODE="false")
+    subprocess.run(
+        [sys.executable, "-c", "from src.database import init_db; init_db()"],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+    )
+    rng = random.Random(3)
+    base = datetime(2024, 1, 1)
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO users (id, name, email, password_hash, created_at) VALUES (?, ?, ?, 'x', ?)",
+        [(user_id, f"user {user_id}", f"user{user_id}@example.com", base.isoformat(" ")) for user_id in range(1, users + 1)],
+    )
+    batch = []
+    for prompt_id in range(1, rows + 1):
+        created = base + timedelta(seconds=prompt_id * 7)
+        batch.append(
+            (
+                rng.randrange(1, users + 1),
+                "Summarise the attached meeting notes in three bullet points.",
+                "Here is a short summary of the notes. " * 8,
+                rng.choice(("completed", "completed", "cached", "error")),
+                created.isoformat(" "),
+                (created + timedelta(seconds=2)).isoformat(" "),
+            )
+        )
+        if len(batch) == 50_000:
+            connection.executemany(
+                "INSERT INTO prompts (user_id, prompt_text, response_text, status, created_at, completed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        connection.executemany(
+            "INSERT INTO prompts (user_id, prompt_text, response_text, status, created_at, completed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+    connection.commit()
+    connection.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    import httpx
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = f"{tmp}/export.db"
+        started = time.perf_counter()
+        _seed(db_path, args.rows, args.users)
+        print(f"seeded {args.rows} prompts in {time.perf_counter() - started:.1f}s")
+
+        port = _free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{db_path}",
+            ADMIN_EMAIL=ADMIN_EMAIL,
+            ADMIN_PASSWORD=ADMIN_PASSWORD,
+            GEMINI_API_KEY="",
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            with httpx.Client(base_url=base_url, timeout=None) as client:
+                for _ in range(100):
+                    try:
+                        client.get("/health")
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.1)
+                token = client.post(
+                    "/api/auth/login",
+                    json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD},
+                ).json()["token"]
+                rss_before = _peak_rss_mb(server.pid)
+
+                params = {"format": args.format, "gzip": str(args.gzip).lower()}
+                received = 0
+                started = time.perf_counter()
+                with client.stream(
+                    "GET",
+                    "/api/admin/prompts/export",
+                    params=params,
+                    headers={"Authorization": f"Bearer {token}"},
+                ) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_raw():
+                        received += len(chunk)
+                elapsed = time.perf_counter() - started
+                rss_after = _peak_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(
+        f"export {args.format}{' gzip' if args.gzip else ''}: {args.rows} rows in {elapsed:.1f}s "
+        f"({args.rows / elapsed:,.0f} rows/s, {received / 1e6:.1f} MB sent)"
+    )
+    print(f"server peak RSS: {rss_before:.0f} MB before export, {rss_after:.0f} MB after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Measures how a login storm affects unrelated endpoints, hashing on the request
+threadpool (PASSWORD_HASH_WORKERS=0, the old behaviour) versus the process pool.
+
+Each run is its own process against a throwaway SQLite database. A probe polls
+GET /api/sessions one request at a time, first idle and then while the storm
+runs, driving the ASGI app in-process over httpx:
+
+    python backend/benchmarks/login_storm.py --logins 300 --login-concurrency 64
+
+The probe defaults to DB_ASYNC_MODE=false, where database calls share the
+threadpool with inline hashing; pass --db-mode async to compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p99_ms": None}
+    return {
+        "count": len(samples),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+        "p99_ms": round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 1),
+    }
+
+
+async def _drive(logins: int, login_concurrency: int, idle_probes: int) -> dict:
+    import httpx
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app import app
+    from src.database import dispose_engines, init_db
+    from src.services.password_hashing import password_hasher
+
+    init_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        credentials = {"email": f"storm-{os.getpid()}@example.com", "password": "bench-password"}
+        response = await client.post("/api/auth/register", json={"name": "Storm", **credentials})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        # The first login also starts the pool workers; keep that out of the storm.
+        (await client.post("/api/auth/login", json=credentials)).raise_for_status()
+
+        async def probe() -> float:
+            started = time.perf_counter()
+            (await client.get("/api/sessions", headers=headers)).raise_for_status()
+            return time.perf_counter() - started
+
+        idle = [await probe() for _ in range(idle_probes)]
+
+        outcomes: dict[int, int] = {}
+        gate = asyncio.Semaphore(login_concurrency)
+        done = asyncio.Event()
+
+        async def login() -> None:
+            async with gate:
+                result = await client.post("/api/auth/login", json=credentials)
+                outcomes[result.status_code] = outcomes.get(result.status_code, 0) + 1
+
+        async def storm() -> None:
+            try:
+                await asyncio.gather(*(login() for _ in range(logins)))
+            finally:
+                done.set()
+
+        during: list[float] = []
+
+        async def keep_probing() -> None:
+            while not done.is_set():
+                during.append(await probe())
+
+        started = time.perf_counter()
+        await asyncio.gather(storm(), keep_probing())
+        elapsed = time.perf_counter() - started
+
+    await dispose_engines()
+    password_hasher.shutdown()
+    return {
+        "logins": logins,
+        "login_concurrency": login_concurrency,
+        "login_status": {str(code): count for code, count in sorted(outcomes.items())},
+        "storm_seconds": round(elapsed, 3),
+        "idle_probe": _percentiles(idle),
+        "storm_probe": _percentiles(during),
+        "hasher": password_hasher.stats(),
+    }
+
+
+def _run(workers: int, args: argparse.Namespace) -> dict:
+    env = dict(
+        os.environ,
+        PASSWORD_HASH_WORKERS=str(workers),
+        # The storm reuses one email and address; measure hashing, not the attempt limiter.
+        AUTH_LIMIT_ENABLED="false",
+        DB_ASYNC_MODE="true" if args.db_mode == "async" else "false",
+    )
+    if workers == 0:
+        # The old inline path had no admission limit.
+        env["PASSWORD_HASH_QUEUE_LIMIT"] = str(args.logins)
+    with tempfile.TemporaryDirectory() as tmp:
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                "--logins", str(args.logins),
+                "--login-concurrency", str(args.login_concurrency),
+                "--idle-probes", str(args.idle_probes),
+            ],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--login-concurrency", type=int, default=64)
+    parser.add_argument("--idle-probes", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=min(2, os.cpu_count() or 1), help="process pool size")
+    parser.add_argument("--db-mode", choices=("async", "sync"), default="sync")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_drive(args.logins, args.login_concurrency, args.idle_probes))))
+        return
+
+    for label, workers in (("threadpool", 0), ("process pool", args.workers)):
+        result = _run(workers, args)
+        idle, storm = result["idle_probe"], result["storm_probe"]
+        print(
+            f"{label:>12}: /api/sessions idle p50 {idle['p50_ms']} ms, during storm "
+            f"p50 {storm['p50_ms']} ms p99 {storm['p99_ms']} ms ({storm['count']} probes)  "
+            f"logins {result['login_status']} in {result['storm_seconds']} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Compares a new Gemini client per call (the old behaviour) with the shared
+pooled client, against a local stand-in for the Gemini REST API:
+
+    python backend/benchmarks/provider_client.py --requests 400 --concurrency 16
+
+The stand-in answers generateContent after --latency-ms and streams
+--stream-chunks chunks for streamGenerateContent, over plain HTTP/1.1 with
+keep-alive, so the difference is client construction (SSL context included)
+and connection setup. Against the real endpoint each new connection also pays
+a TLS handshake, so these numbers understate the gap.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MODEL = "gemini-2.0-flash"
+
+
+def _candidate(text: str) -> bytes:
+    return json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}).encode("utf-8")
+
+
+def stand_in_server(latency_ms: float, stream_chunks: int) -> ThreadingHTTPServer:
+    """Starts the stand-in on a free local port, serving from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_ms / 1000)
+            if ":streamGenerateContent" not in self.path:
+                body = _candidate("stand-in reply")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index in range(stream_chunks):
+                event = b"data: " + _candidate(f"chunk {index} ") + b"\r\n\r\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            self.wfile.write(b"0\r\n\r\n")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gemini-stand-in", daemon=True).start()
+    return server
+
+
+def _percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+        "p99_ms": round(samples[max(int(len(samples) * 0.99) - 1, 0)] * 1000, 2),
+    }
+
+
+def _measure(call, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+
+    def one(index: int) -> None:
+        started = time.perf_counter()
+        call(index)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    return {"requests_per_second": round(requests / elapsed, 1), **_percentiles(latencies)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="stand-in think time per call")
+    parser.add_argument("--stream-chunks", type=int, default=10)
+    args = parser.parse_args()
+
+    server = stand_in_server(args.latency_ms, args.stream_chunks)
+    os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["GEMINI_API_KEY"] = "stand-in"
+    sys.path.insert(0, str(BACKEND_DIR))
+    from google import genai
+    from google.genai import types
+
+    from src.services.gemini_client import abortable_stream, build_client
+
+    per_call_options = types.HttpOptions(base_url=os.environ["GEMINI_BASE_URL"])
+    shared = build_client("stand-in")
+
+    def per_call_generate(index: int) -> None:
+        client = genai.Client(api_key="stand-in", http_options=per_call_options)
+        client.models.generate_content(model=MODEL, contents=f"prompt {index}")
+
+    def shared_generate(index: int) -> None:
+        shared.models.generate_content(model=MODEL, contents=f"prompt {index}")
+
+    def per_call_stream(index: int) -> None:
+        client = genai.Client(api_key="stand-in", http_options=per_call_options)
+        try:
+            for _ in client.models.generate_content_stream(model=MODEL, contents=f"prompt {index}"):
+                pass
+        finally:
+            client._api_client._httpx_client.close()
+
+    def shared_stream(index: int) -> None:
+        with abortable_stream():
+            for _ in shared.models.generate_content_stream(model=MODEL, contents=f"prompt {index}"):
+                pass
+
+    try:
+        for label, before, after in (
+            ("generate", per_call_generate, shared_generate),
+            ("stream", per_call_stream, shared_stream),
+        ):
+            for client_label, call in (("per-call", before), ("shared", after)):
+                result = _measure(call, args.requests, args.concurrency)
+                print(
+                    f"{label:>8} {client_label:>8}: {result['requests_per_second']:>8} req/s  "
+                    f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms"
+                )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
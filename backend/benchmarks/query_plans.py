@@ -0,0 +1,158 @@
+"""
+Query-plan regression check for the hot read paths (SQLite).
+
+Seeds a throwaway database with a large, skewed dataset, runs ANALYZE, then
+asserts via EXPLAIN QUERY PLAN that each hot query reads through an index and
+never builds a temp B-tree to sort:
+
+    python backend/benchmarks/query_plans.py --users 200 --sessions 20 --prompts 40
+
+Exits non-zero if any plan regresses. backend/tests/test_query_plans.py runs
+the same checks under pytest.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def seed(engine, users: int, sessions_per_user: int, prompts_per_session: int) -> None:
+    from sqlalchemy import insert
+
+    from src.models import ChatSession, Prompt, User
+
+    rng = random.Random(13)
+    base = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [
+                {
+                    "id": user_id,
+                    "name": f"user {user_id}",
+                    "email": f"user{user_id}@example.com",
+                    "password_hash": "x",
+                    "created_at": base,
+                }
+                for user_id in range(1, users + 1)
+            ],
+        )
+        session_rows = []
+        prompt_rows = []
+        session_id = 0
+        for user_id in range(1, users + 1):
+            # One tenant is much larger than the rest, like the ones that sort in memory today.
+            multiplier = 10 if user_id == 1 else 1
+            for _ in range(sessions_per_user * multiplier):
+                session_id += 1
+                created = base + timedelta(minutes=rng.randrange(500_000))
+                session_rows.append(
+                    {
+                        "id": session_id,
+                        "user_id": user_id,
+                        "title": "seed",
+                        "created_at": created,
+                        "updated_at": created + timedelta(minutes=rng.randrange(10_000)),
+                        "deleted_at": created if rng.random() < 0.1 else None,
+                    }
+                )
+                for _ in range(prompts_per_session):
+                    prompt_rows.append(
+                        {
+                            "user_id": user_id,
+                            "session_id": session_id,
+                            "prompt_text": "seed prompt",
+                            "response_text": "seed response",
+                            "status": "completed",
+                            "created_at": created + timedelta(seconds=rng.randrange(1_000_000)),
+                        }
+                    )
+        connection.execute(insert(ChatSession), session_rows)
+        connection.execute(insert(Prompt), prompt_rows)
+        connection.exec_driver_sql("ANALYZE")
+
+
+def hot_queries() -> dict:
+    from sqlalchemy import and_, or_, select
+
+    from src.api.prompts import prompt_history_query
+    from src.api.sessions import session_list_query
+    from src.models import ChatSession, Prompt, User
+
+    cursor_at = datetime(2024, 6, 1)
+    return {
+        "list_sessions": session_list_query(1).limit(51),
+        "list_sessions_next_page": session_list_query(1)
+        .where(
+            or_(
+                ChatSession.updated_at < cursor_at,
+                and_(ChatSession.updated_at == cursor_at, ChatSession.id < 100),
+            )
+        )
+        .limit(51),
+        "prompt_history": prompt_history_query(1).limit(51),
+        "prompt_history_by_session": prompt_history_query(1, 1),
+        "prompt_history_next_page": prompt_history_query(1)
+        .where(or_(Prompt.created_at > cursor_at, and_(Prompt.created_at == cursor_at, Prompt.id > 100)))
+        .limit(51),
+        "admin_users": select(User).order_by(User.created_at.desc(), User.id.desc()).limit(51),
+        "admin_prompts": select(Prompt, User)
+        .join(User, Prompt.user_id == User.id)
+        .order_by(Prompt.created_at.desc(), Prompt.id.desc())
+        .limit(51),
+    }
+
+
+def plan_problems(connection, statement) -> tuple[list[str], list[str]]:
+    """(plan steps, problems): temp B-tree sorts and table scans without an index."""
+    sql = str(statement.compile(connection, compile_kwargs={"literal_binds": True}))
+    plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    problems = []
+    for step in plan:
+        if "TEMP B-TREE" in step:
+            problems.append(f"sorts in a temp B-tree: {step}")
+        if step.startswith("SCAN") and "USING" not in step:
+            problems.append(f"full table scan: {step}")
+    return plan, problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=20, help="sessions per user")
+    parser.add_argument("--prompts", type=int, default=40, help="prompts per session")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/plans.db"
+        os.environ["DB_ASYNC_MODE"] = "false"
+        sys.path.insert(0, str(BACKEND_DIR))
+        from src.database import engine, init_db
+
+        init_db()
+        seed(engine, args.users, args.sessions, args.prompts)
+
+        failures = []
+        with engine.connect() as connection:
+            for name, statement in hot_queries().items():
+                plan, problems = plan_problems(connection, statement)
+                print(f"{name}:")
+                for step in plan:
+                    print(f"    {step}")
+                failures.extend(f"{name}: {problem}" for problem in problems)
+        engine.dispose()
+
+    if failures:
+        print("\n".join(["", "Plan regressions:", *failures]))
+        sys.exit(1)
+    print("\nAll hot queries use an index without a temp B-tree sort.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Keeps a SQLite file in sync with the primary as a stand-in read replica, so
+replica routing can be exercised locally without MySQL replication:
+
+    python backend/benchmarks/sqlite_replica.py database/app.db database/replica.db --interval 1
+
+then start the backend with DATABASE_REPLICA_URLS=sqlite:///database/replica.db.
+Each pass is a full online backup; --lag delays every pass to simulate a
+lagging replica. Import sync_sqlite_replica to trigger a pass from a script.
+"""
+import argparse
+import sqlite3
+import time
+
+
+def sync_sqlite_replica(primary_path: str, replica_path: str) -> None:
+    """Copies the primary into the replica with the online backup API (readers stay consistent)."""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between passes")
+    parser.add_argument("--lag", type=float, default=0.0, help="extra delay before each pass")
+    parser.add_argument("--once", action="store_true", help="sync once and exit")
+    args = parser.parse_args()
+
+    while True:
+        time.sleep(args.lag)
+        started = time.perf_counter()
+        sync_sqlite_replica(args.primary, args.replica)
+        print(f"synced in {(time.perf_counter() - started) * 1000:.1f} ms", flush=True)
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
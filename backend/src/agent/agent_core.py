@@ -1,13 +1,20 @@
+import io
 import os
 import sys
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
+from ..services.gemini_client import close_client, get_client
 from ..tools.get_files_info import schema_get_files_info
 from ..tools.get_file_contents import schema_get_file_content
 from ..tools.write_file import schema_write_file
 from ..tools.run_python_file import schema_run_python_file
-from .tools import call_function
+from .tools import call_footprint, call_function
+
+# Threads for running a turn's independent read-only tool calls side by side
+AGENT_TOOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "4"))
 
 def pretty_tool_output(function_call_result):
     # Extract and format the result for nicer output
@@ -29,18 +36,67 @@ def pretty_tool_output(function_call_result):
             return "\n--- Tool Output ---\n" + str(resp) + "\n--- End ---"
     return ""
 
+def plan_tool_waves(function_calls):
+    """
+    Groups one turn's tool calls into waves whose calls may run concurrently.
+    A call lands one wave after the last earlier call it conflicts with:
+    write_file, run_python_file and unknown tools conflict with every call,
+    and two reads conflict when they touch the same path.
+    """
+    footprints = [call_footprint(call) for call in function_calls]
+    levels = []
+    for index, path in enumerate(footprints):
+        level = 0
+        for earlier in range(index):
+            other = footprints[earlier]
+            if path is None or other is None or path == other:
+                level = max(level, levels[earlier] + 1)
+        levels.append(level)
+
+    waves = [[] for _ in range(max(levels, default=-1) + 1)]
+    for index, level in enumerate(levels):
+        waves[level].append(index)
+    return waves
+
+def run_tool_calls(function_calls, executor, verbose=False):
+    """
+    Runs a turn's tool calls wave by wave; results come back in the original call order.
+    Calls in a concurrent wave log to their own buffer, printed in call order once the wave ends.
+    """
+    waves = plan_tool_waves(function_calls)
+    results = [None] * len(function_calls)
+    for wave in waves:
+        if len(wave) == 1:
+            results[wave[0]] = call_function(function_calls[wave[0]], verbose=verbose)
+            continue
+        buffers = {index: io.StringIO() for index in wave}
+        outputs = executor.map(
+            lambda index: call_function(function_calls[index], verbose=verbose, out=buffers[index]), wave
+        )
+        for index, result in zip(wave, outputs):
+            results[index] = result
+            sys.stdout.write(buffers[index].getvalue())
+    return results, len(waves)
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python main.py 'your request'")
         sys.exit(1)
 
     load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY")
     prompt = sys.argv[1]
     verbose = '--verbose' in sys.argv
     
-    client = genai.Client(api_key=api_key)
-    
+    client = get_client()
+    if client is None:
+        print("GEMINI_API_KEY is not set")
+        sys.exit(1)
+    try:
+        run_agent(client, prompt, verbose)
+    finally:
+        asyncio.run(close_client())
+
+def run_agent(client, prompt, verbose=False):
     tools = types.Tool(function_declarations=[
         schema_get_files_info,
         schema_get_file_content,
@@ -60,40 +116,70 @@ Read files before making changes. Make actual code fixes."""
         system_instruction=system_prompt
     )
 
-    for iteration in range(10):
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=messages,
-            config=config,
-        )
-        
-        # Handle function calls
-        if hasattr(response, 'function_calls') and response.function_calls:
-            for function_call_part in response.function_calls:
-                function_call_result = call_function(function_call_part, verbose=verbose)
-                messages.append(types.Content(role="user", parts=function_call_result.parts))
-                # Only print tool output if verbose
-                if verbose:
-                    print(f"\n - Calling function: {function_call_part.name}")
-                    print(pretty_tool_output(function_call_result))
+    # Wall-clock seconds per turn: model call, tool calls and the whole turn
+    turn_timings = []
+    executor = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+    try:
+        for iteration in range(10):
+            turn_started = time.perf_counter()
+            response = client.models.generate_content(
+                model="gemini-2.0-flash-001",
+                contents=messages,
+                config=config,
+            )
+            model_seconds = time.perf_counter() - turn_started
+            
+            # Handle function calls
+            tool_seconds, call_count, wave_count = 0.0, 0, 0
+            if hasattr(response, 'function_calls') and response.function_calls:
+                function_calls = list(response.function_calls)
+                tools_started = time.perf_counter()
+                results, wave_count = run_tool_calls(function_calls, executor, verbose=verbose)
+                tool_seconds = time.perf_counter() - tools_started
+                call_count = len(function_calls)
+                for function_call_part, function_call_result in zip(function_calls, results):
+                    messages.append(types.Content(role="user", parts=function_call_result.parts))
+                    # Only print tool output if verbose
+                    if verbose:
+                        print(f"\n - Calling function: {function_call_part.name}")
+                        print(pretty_tool_output(function_call_result))
+
+            turn_timings.append({
+                "turn": iteration + 1,
+                "model_seconds": round(model_seconds, 3),
+                "tool_seconds": round(tool_seconds, 3),
+                "tool_calls": call_count,
+                "tool_waves": wave_count,
+                "turn_seconds": round(time.perf_counter() - turn_started, 3),
+            })
+            if verbose:
+                timing = turn_timings[-1]
+                print(
+                    f"\n[Turn {timing['turn']}] {timing['turn_seconds']:.2f}s "
+                    f"(model {timing['model_seconds']:.2f}s, {call_count} tool calls "
+                    f"in {wave_count} waves {timing['tool_seconds']:.2f}s)"
+                )
 
-        # Add model responses
-        if hasattr(response, 'candidates') and response.candidates:
-            for candidate in response.candidates:
-                if hasattr(candidate, 'content') and candidate.content and candidate.content.parts:
-                    messages.append(candidate.content)
-                    # Print model output if verbose
-                    if verbose and hasattr(candidate.content, 'text') and candidate.content.text:
-                        print("\n[Model Output]:")
-                        print(candidate.content.text)
-        
-        # Final response
-        if hasattr(response, 'text') and response.text:
-            print("\nResponse:")
-            print(response.text)
-            return
+            # Add model responses
+            if hasattr(response, 'candidates') and response.candidates:
+                for candidate in response.candidates:
+                    if hasattr(candidate, 'content') and candidate.content and candidate.content.parts:
+                        messages.append(candidate.content)
+                        # Print model output if verbose
+                        if verbose and hasattr(candidate.content, 'text') and candidate.content.text:
+                            print("\n[Model Output]:")
+                            print(candidate.content.text)
+            
+            # Final response
+            if hasattr(response, 'text') and response.text:
+                print("\nResponse:")
+                print(response.text)
+                return turn_timings
+    finally:
+        executor.shutdown(wait=True)
 
     print("Agent completed")
+    return turn_timings
 
 if __name__ == "__main__":
     main()
@@ -17,6 +17,9 @@ function_map = {
     "run_python_file": run_python_file,
 }
 
+# Tools that only read inside the working directory; the agent may run these concurrently
+READ_ONLY_FUNCTIONS = {"get_files_info", "get_file_content"}
+
 def smart_file_search(filename, working_directory=WORKING_DIRECTORY, max_matches=3):
     """
     Enhanced file search with fuzzy matching and priority scoring
@@ -150,6 +153,22 @@ def validate_and_enhance_args(function_name, args, working_directory=WORKING_DIR
     
     return enhanced_args
 
+def call_footprint(function_call_part):
+    """
+    Resolved path a read-only call touches, for conflict analysis.
+    Returns None for calls that may write or run code (and unknown tools).
+    """
+    function_name = function_call_part.name
+    if function_name not in READ_ONLY_FUNCTIONS:
+        return None
+    raw_args = dict(function_call_part.args) if function_call_part.args else {}
+    try:
+        args = validate_and_enhance_args(function_name, raw_args, WORKING_DIRECTORY)
+    except Exception:
+        return None
+    path = args.get("directory") if function_name == "get_files_info" else args.get("file_path")
+    return os.path.normpath(path) if isinstance(path, str) else None
+
 def format_function_result(function_name, result, success=True):
     """
     Format function results consistently
@@ -175,9 +194,10 @@ def format_function_result(function_name, result, success=True):
             ],
         )
 
-def call_function(function_call_part, verbose=False):
+def call_function(function_call_part, verbose=False, out=None):
     """
-    Enhanced function caller with smart file resolution and better error handling
+    Enhanced function caller with smart file resolution and better error handling.
+    Progress goes to out (stdout by default), so concurrent calls can be buffered.
     """
     function_name = function_call_part.name
     raw_args = dict(function_call_part.args) if function_call_part.args else {}
@@ -187,33 +207,33 @@ def call_function(function_call_part, verbose=False):
         args = validate_and_enhance_args(function_name, raw_args, WORKING_DIRECTORY)
     except Exception as e:
         if verbose:
-            print(f"Error processing arguments for {function_name}: {e}")
+            print(f"Error processing arguments for {function_name}: {e}", file=out)
         return format_function_result(function_name, f"Argument processing error: {e}", success=False)
     
     # Log function call
     if verbose:
-        print(f"Calling function: {function_name}")
-        print(f"  Raw args: {raw_args}")
-        print(f"  Enhanced args: {args}")
+        print(f"Calling function: {function_name}", file=out)
+        print(f"  Raw args: {raw_args}", file=out)
+        print(f"  Enhanced args: {args}", file=out)
         if 'file_path' in args and 'file_path' in raw_args:
             if args['file_path'] != raw_args['file_path']:
-                print(f"  File path resolved: '{raw_args['file_path']}' → '{args['file_path']}'")
+                print(f"  File path resolved: '{raw_args['file_path']}' → '{args['file_path']}'", file=out)
     else:
-        print(f" - Calling function: {function_name}", end="")
+        print(f" - Calling function: {function_name}", end="", file=out)
         if 'file_path' in args and 'file_path' in raw_args:
             if args['file_path'] != raw_args['file_path']:
-                print(f" (resolved: {args['file_path']})")
+                print(f" (resolved: {args['file_path']})", file=out)
             else:
-                print()
+                print(file=out)
         else:
-            print()
+            print(file=out)
     
     # Get and call the function
     func = function_map.get(function_name)
     if not func:
         error_msg = f"Unknown function: {function_name}"
         if verbose:
-            print(f"Error: {error_msg}")
+            print(f"Error: {error_msg}", file=out)
         return format_function_result(function_name, error_msg, success=False)
     
     # Execute function with error handling
@@ -227,14 +247,14 @@ def call_function(function_call_part, verbose=False):
                 result = f"Contents of '{args.get('directory', '.')}' in working directory '{WORKING_DIRECTORY}':\n{result}"
         
         if verbose:
-            print(f"Function result: {result}")
+            print(f"Function result: {result}", file=out)
         
         return format_function_result(function_name, result, success=True)
         
     except Exception as e:
         error_msg = f"{type(e).__name__}: {e}"
         if verbose:
-            print(f"Error executing {function_name}: {error_msg}")
+            print(f"Error executing {function_name}: {error_msg}", file=out)
         return format_function_result(function_name, error_msg, success=False)
 
 # Utility function for getting current working directory info
@@ -1,34 +1,122 @@
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends
+from datetime import datetime, timedelta
+from typing import Literal
 
-from ..database import get_db
-from ..models import Prompt, User
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from ..database import get_db, pool_stats
+from ..models import ModelLatencyRollup, Prompt, PromptRollup, ResponseCacheEntry, UsageTotal, User
+from ..services.auth_limits import auth_limiter
+from ..services.hedging import hedge_budget
+from ..services.model_registry import model_registry
+from ..services.password_hashing import password_hasher
+from ..services.prompt_export import ExportFilters, stream_prompt_export
+from ..services.provider_limits import provider_limiter
+from ..services.response_cache import response_cache
+from ..services.text_storage import TEXT_STORAGE_ENABLED, migrate_inline_bodies, storage_report
+from ..services.token_cache import token_cache
+from ..services.usage_stats import default_window, latency_percentiles, usage_stats
+from ..services.user_cache import CachedUser, user_cache
 from .auth import get_admin_user
+from .pagination import PageParams, page_params, paginate
 
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
 @router.get("/overview")
-def get_admin_overview(
-    db: Session = Depends(get_db),
-    _admin: User = Depends(get_admin_user),
+async def get_admin_overview(
+    db: AsyncSession = Depends(get_db),
+    _admin: CachedUser = Depends(get_admin_user),
+):
+    # Rollups only: no scan of users or prompts, however large they get.
+    totals = {row.name: row.value for row in await db.scalars(select(UsageTotal))}
+    pending = usage_stats.pending_totals()
+    by_status = await db.execute(
+        select(PromptRollup.status, func.sum(PromptRollup.count))
+        .where(PromptRollup.granularity == "day")
+        .group_by(PromptRollup.status)
+    )
+    since = datetime.utcnow() - timedelta(hours=24)
+    latency_rows = await db.scalars(select(ModelLatencyRollup).where(ModelLatencyRollup.bucket_start >= since))
+    return {
+        "user_count": totals.get("users", 0) + pending.get("users", 0),
+        "prompt_count": totals.get("prompts", 0) + pending.get("prompts", 0),
+        "prompts_by_status": {name: int(count) for name, count in by_status if count},
+        "model_latency_24h": latency_percentiles(latency_rows),
+    }
+
+
+@router.get("/stats/timeseries")
+async def get_prompt_timeseries(
+    granularity: Literal["hour", "day"] = "hour",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    db: AsyncSession = Depends(get_db),
+    _admin: CachedUser = Depends(get_admin_user),
 ):
-    user_count = db.query(func.count(User.id)).scalar() or 0
-    prompt_count = db.query(func.count(Prompt.id)).scalar() or 0
+    until = until or datetime.utcnow()
+    since = since or until - default_window(granularity)
+    rows = await db.scalars(
+        select(PromptRollup)
+        .where(
+            PromptRollup.granularity == granularity,
+            PromptRollup.bucket_start >= since,
+            PromptRollup.bucket_start <= until,
+        )
+        .order_by(PromptRollup.bucket_start)
+    )
+    buckets: dict[datetime, dict[str, int]] = {}
+    for row in rows:
+        if row.count:
+            buckets.setdefault(row.bucket_start, {})[row.status] = row.count
+    latency_rows = await db.scalars(
+        select(ModelLatencyRollup).where(
+            ModelLatencyRollup.bucket_start >= since,
+            ModelLatencyRollup.bucket_start <= until,
+        )
+    )
     return {
-        "user_count": user_count,
-        "prompt_count": prompt_count,
+        "granularity": granularity,
+        "since": since,
+        "until": until,
+        "buckets": [
+            {"bucket_start": started, "total": sum(counts.values()), "by_status": counts}
+            for started, counts in buckets.items()
+        ],
+        "model_latency": latency_percentiles(latency_rows),
     }
 
 
+@router.get("/stats/reconcile")
+async def reconcile_usage_stats(
+    repair: bool = False,
+    _admin: CachedUser = Depends(get_admin_user),
+):
+    # Full scans of the raw tables; an explicit admin check, never on a dashboard path.
+    return await run_in_threadpool(usage_stats.reconcile, repair)
+
+
 @router.get("/users")
-def get_users(
-    db: Session = Depends(get_db),
-    _admin: User = Depends(get_admin_user),
+async def get_users(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    _admin: CachedUser = Depends(get_admin_user),
 ):
-    rows = db.query(User).order_by(User.created_at.desc()).all()
+    rows = await paginate(
+        db,
+        select(User).order_by(User.created_at.desc(), User.id.desc()),
+        page,
+        response,
+        sort_column=User.created_at,
+        id_column=User.id,
+        key=lambda row: (row.created_at, row.id),
+        descending=True,
+    )
     return [
         {
             "id": row.id,
@@ -41,15 +129,24 @@ def get_users(
 
 
 @router.get("/prompts")
-def get_all_prompts(
-    db: Session = Depends(get_db),
-    _admin: User = Depends(get_admin_user),
+async def get_all_prompts(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    _admin: CachedUser = Depends(get_admin_user),
 ):
-    rows = (
-        db.query(Prompt, User)
+    rows = await paginate(
+        db,
+        select(Prompt, User)
         .join(User, Prompt.user_id == User.id)
-        .order_by(Prompt.created_at.desc())
-        .all()
+        .order_by(Prompt.created_at.desc(), Prompt.id.desc()),
+        page,
+        response,
+        sort_column=Prompt.created_at,
+        id_column=Prompt.id,
+        key=lambda row: (row[0].created_at, row[0].id),
+        descending=True,
+        scalars=False,
     )
     return [
         {
@@ -62,3 +159,84 @@ def get_all_prompts(
         }
         for prompt, user in rows
     ]
+
+
+@router.get("/prompts/export")
+async def export_prompts(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    user_id: int | None = None,
+    prompt_status: str | None = Query(default=None, alias="status"),
+    _admin: CachedUser = Depends(get_admin_user),
+):
+    filters = ExportFilters(since=since, until=until, user_id=user_id, status=prompt_status)
+    filename = f"prompts.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("application/x-ndjson" if format == "ndjson" else "text/csv")
+    return StreamingResponse(
+        stream_prompt_export(filters, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/models")
+async def get_model_health(_admin: CachedUser = Depends(get_admin_user)):
+    return {
+        **model_registry.snapshot(),
+        "hedging": hedge_budget.snapshot(),
+    }
+
+
+@router.get("/cache")
+async def get_response_cache_stats(
+    db: AsyncSession = Depends(get_db),
+    _admin: CachedUser = Depends(get_admin_user),
+):
+    db_rows = await db.scalar(select(func.count()).select_from(ResponseCacheEntry))
+    return {**response_cache.stats(), "db_rows": db_rows}
+
+
+@router.get("/auth-cache")
+async def get_auth_cache_stats(_admin: CachedUser = Depends(get_admin_user)):
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+
+@router.get("/auth-limits")
+async def get_auth_limit_stats(_admin: CachedUser = Depends(get_admin_user)):
+    # The SQLite store reads its file; keep that off the event loop.
+    return await run_in_threadpool(auth_limiter.stats)
+
+
+@router.get("/password-hashing")
+async def get_password_hashing_stats(_admin: CachedUser = Depends(get_admin_user)):
+    return password_hasher.stats()
+
+
+@router.get("/providers")
+async def get_provider_limits(_admin: CachedUser = Depends(get_admin_user)):
+    return provider_limiter.snapshot()
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats(_admin: CachedUser = Depends(get_admin_user)):
+    return pool_stats()
+
+
+@router.get("/storage")
+async def get_text_storage_report(_admin: CachedUser = Depends(get_admin_user)):
+    # Sums over every prompt row; an on-demand admin report.
+    return await run_in_threadpool(storage_report)
+
+
+@router.post("/storage/migrate")
+async def migrate_text_storage(
+    batch_rows: int = Query(default=500, ge=1, le=10_000),
+    max_batches: int | None = Query(default=None, ge=1),
+    _admin: CachedUser = Depends(get_admin_user),
+):
+    if not TEXT_STORAGE_ENABLED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Text storage is disabled")
+    result = await run_in_threadpool(migrate_inline_bodies, batch_rows, max_batches)
+    return {**result, "report": await run_in_threadpool(storage_report)}
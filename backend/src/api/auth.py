@@ -4,16 +4,22 @@ import hmac
 import json
 import os
 import re
-import secrets
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..database import fetch_by_id, get_db
 from ..models import User
 from ..schemas import AuthResponse, UserLoginRequest, UserRegisterRequest, UserResponse
+from ..services.auth_limits import AuthRateLimited, auth_limiter
+from ..services.password_hashing import PasswordHasherBusy, password_hasher
+from ..services.token_cache import token_cache
+from ..services.usage_stats import usage_stats
+from ..services.user_cache import CachedUser, user_cache
 
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
@@ -42,94 +48,195 @@ def _b64url_decode(data: str) -> bytes:
     return base64.urlsafe_b64decode(data + padding)
 
 
-def hash_password(password: str, salt: bytes | None = None) -> str:
-    salt_bytes = salt or secrets.token_bytes(16)
-    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt_bytes, 150_000)
-    return f"{_b64url_encode(salt_bytes)}${_b64url_encode(digest)}"
+def _parse_signing_keys(spec: str) -> dict[str, bytes]:
+    keys = {}
+    for entry in spec.split(","):
+        kid, separator, secret = entry.strip().partition(":")
+        if separator and kid.strip() and secret:
+            keys[kid.strip()] = secret.encode("utf-8")
+    return keys or {"default": AUTH_SECRET.encode("utf-8")}
 
 
-def verify_password(password: str, stored_hash: str) -> bool:
-    try:
-        salt_b64, digest_b64 = stored_hash.split("$", maxsplit=1)
-        salt = _b64url_decode(salt_b64)
-        expected_digest = _b64url_decode(digest_b64)
-    except ValueError:
-        return False
-
-    actual_digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, 150_000)
-    return hmac.compare_digest(actual_digest, expected_digest)
+# "kid:secret,kid:secret": the first key signs new tokens, every listed key still verifies.
+# Rotate by prepending a key and dropping the old one after AUTH_TOKEN_HOURS.
+AUTH_SIGNING_KEYS = _parse_signing_keys(os.getenv("AUTH_SIGNING_KEYS", ""))
+ACTIVE_KID = next(iter(AUTH_SIGNING_KEYS))
+# Tokens issued before key ids have no kid and were signed with AUTH_SECRET. Every such
+# token has expired AUTH_TOKEN_HOURS after the upgrade; set this to false from then on.
+AUTH_ACCEPT_LEGACY_TOKENS = os.getenv("AUTH_ACCEPT_LEGACY_TOKENS", "true").lower() == "true"
+LEGACY_SIGNING_KEY = AUTH_SECRET.encode("utf-8") if AUTH_ACCEPT_LEGACY_TOKENS else None
 
 
-def create_token(user_id: int, email: str) -> str:
-    header = _b64url_encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode("utf-8"))
+def create_token(user: CachedUser) -> str:
+    header = _b64url_encode(json.dumps({"alg": "HS256", "typ": "JWT", "kid": ACTIVE_KID}).encode("utf-8"))
     payload = _b64url_encode(
         json.dumps(
             {
-                "sub": user_id,
-                "email": email,
+                "sub": user.id,
+                "email": user.email,
+                "name": user.name,
+                "adm": user.is_admin,
+                "created_at": user.created_at.isoformat(),
                 "exp": int((datetime.now(timezone.utc) + timedelta(hours=TOKEN_TTL_HOURS)).timestamp()),
             }
         ).encode("utf-8")
     )
     signing_input = f"{header}.{payload}".encode("utf-8")
-    signature = hmac.new(AUTH_SECRET.encode("utf-8"), signing_input, hashlib.sha256).digest()
+    signature = hmac.new(AUTH_SIGNING_KEYS[ACTIVE_KID], signing_input, hashlib.sha256).digest()
     return f"{header}.{payload}.{_b64url_encode(signature)}"
 
 
 def decode_token(token: str) -> dict:
+    verified = token_cache.get(token)
+    if verified is not None:
+        return verified
+
+    invalid = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     try:
         header, payload, signature = token.split(".")
+        header_data = json.loads(_b64url_decode(header))
+        signature_bytes = _b64url_decode(signature)
     except ValueError as exc:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from exc
-
+        raise invalid from exc
+    # Well-formed JSON is not enough: "[]" or {"kid": ["a"]} must be a 401, not a 500.
+    if not isinstance(header_data, dict):
+        raise invalid
+    kid = header_data.get("kid")
+    if kid is not None and not isinstance(kid, str):
+        raise invalid
+
+    key = AUTH_SIGNING_KEYS.get(kid) if kid is not None else LEGACY_SIGNING_KEY
+    if key is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unknown token signing key")
     signing_input = f"{header}.{payload}".encode("utf-8")
-    expected_sig = hmac.new(AUTH_SECRET.encode("utf-8"), signing_input, hashlib.sha256).digest()
-    if not hmac.compare_digest(expected_sig, _b64url_decode(signature)):
+    expected_sig = hmac.new(key, signing_input, hashlib.sha256).digest()
+    if not hmac.compare_digest(expected_sig, signature_bytes):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token signature")
 
-    payload_data = json.loads(_b64url_decode(payload))
-    if int(payload_data.get("exp", 0)) < int(datetime.now(timezone.utc).timestamp()):
+    try:
+        payload_data = json.loads(_b64url_decode(payload))
+        expires_at = int(payload_data.get("exp", 0))
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise invalid from exc
+    if expires_at < int(datetime.now(timezone.utc).timestamp()):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    token_cache.put(token, payload_data, expires_at)
     return payload_data
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials | None = Depends(auth_scheme),
-    db: Session = Depends(get_db),
-) -> User:
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _check_attempt_limits(action: str, email: str, request: Request) -> None:
+    # Runs before any query or hash; the request session opens lazily, so no connection is used either.
+    client_ip = request.client.host if request.client else ""
+    try:
+        if auth_limiter.store.blocking:
+            await run_in_threadpool(auth_limiter.check, action, email, client_ip)
+        else:
+            auth_limiter.check(action, email, client_ip)
+    except AuthRateLimited as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, retry later",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+async def _hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as exc:
+        raise _hashing_busy() from exc
+
+
+def to_cached_user(user: User) -> CachedUser:
+    return CachedUser(
+        id=user.id,
+        name=user.name,
+        email=user.email,
+        created_at=user.created_at,
+        is_admin=user.email.lower() in ADMIN_EMAILS,
+    )
+
+
+def _bearer_payload(credentials: HTTPAuthorizationCredentials | None) -> dict:
     if not credentials or credentials.scheme.lower() != "bearer":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
     payload = decode_token(credentials.credentials)
-    user_id = payload.get("sub")
-    if not user_id:
+    if not payload.get("sub"):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+    return payload
 
-    user = db.get(User, int(user_id))
+
+async def _load_user(user_id: int) -> CachedUser:
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # Misses read the primary, so a user registered a moment ago is never missing on a lagging replica.
+    generation = user_cache.generation
+    user = await fetch_by_id(User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    cached = to_cached_user(user)
+    user_cache.put(cached, generation)
+    return cached
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(auth_scheme),
+) -> CachedUser:
+    payload = _bearer_payload(credentials)
+    return await _load_user(int(payload["sub"]))
 
 
-def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.email.lower() not in ADMIN_EMAILS:
+async def get_token_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(auth_scheme),
+) -> CachedUser:
+    """
+    The caller as their token describes them, with no user lookup: name and
+    admin status are as of sign-in. Tokens issued before these claims existed
+    fall back to the get_current_user lookup.
+    """
+    payload = _bearer_payload(credentials)
+    if "name" not in payload or "adm" not in payload or "created_at" not in payload:
+        return await _load_user(int(payload["sub"]))
+    return CachedUser(
+        id=int(payload["sub"]),
+        name=payload["name"],
+        email=payload["email"],
+        created_at=datetime.fromisoformat(payload["created_at"]),
+        is_admin=bool(payload["adm"]),
+    )
+
+
+async def get_admin_user(current_user: CachedUser = Depends(get_token_user)) -> CachedUser:
+    if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return current_user
 
 
-def to_user_response(user: User) -> UserResponse:
+def to_user_response(user: CachedUser) -> UserResponse:
     return UserResponse(
         id=user.id,
         name=user.name,
         email=user.email,
-        is_admin=user.email.lower() in ADMIN_EMAILS,
+        is_admin=user.is_admin,
         created_at=user.created_at,
     )
 
 
 @router.post("/register", response_model=AuthResponse)
-def register_user(payload: UserRegisterRequest, db: Session = Depends(get_db)):
+async def register_user(payload: UserRegisterRequest, request: Request, db: AsyncSession = Depends(get_db)):
     email = payload.email.strip().lower()
+    await _check_attempt_limits("register", email, request)
     if not EMAIL_RE.match(email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid email")
     if ADMIN_BOOTSTRAP_EMAIL and email == ADMIN_BOOTSTRAP_EMAIL:
@@ -138,55 +245,76 @@ def register_user(payload: UserRegisterRequest, db: Session = Depends(get_db)):
             detail="This email is reserved for admin login",
         )
 
-    existing = db.query(User).filter(User.email == email).first()
+    existing = await db.scalar(select(User).where(User.email == email).limit(1))
     if existing:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered")
 
+    password_hash = await _hash_password(payload.password)
     user = User(
         name=payload.name.strip(),
         email=email,
-        password_hash=hash_password(payload.password),
+        password_hash=password_hash,
         created_at=datetime.utcnow(),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    usage_stats.record_user()
+    cached = to_cached_user(user)
+    user_cache.put(cached)
 
-    token = create_token(user.id, user.email)
-    return AuthResponse(token=token, user=to_user_response(user))
+    token = create_token(cached)
+    return AuthResponse(token=token, user=to_user_response(cached))
 
 
 @router.post("/login", response_model=AuthResponse)
-def login_user(payload: UserLoginRequest, db: Session = Depends(get_db)):
+async def login_user(payload: UserLoginRequest, request: Request, db: AsyncSession = Depends(get_db)):
     email = payload.email.strip().lower()
+    await _check_attempt_limits("login", email, request)
     if (
         ADMIN_BOOTSTRAP_EMAIL
         and ADMIN_BOOTSTRAP_PASSWORD
         and email == ADMIN_BOOTSTRAP_EMAIL
         and payload.password == ADMIN_BOOTSTRAP_PASSWORD
     ):
-        user = db.query(User).filter(User.email == email).first()
+        user = await db.scalar(select(User).where(User.email == email).limit(1))
         if not user:
             user = User(
                 name=ADMIN_BOOTSTRAP_NAME,
                 email=email,
-                password_hash=hash_password(ADMIN_BOOTSTRAP_PASSWORD),
+                password_hash=await _hash_password(ADMIN_BOOTSTRAP_PASSWORD),
                 created_at=datetime.utcnow(),
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
-        token = create_token(user.id, user.email)
-        return AuthResponse(token=token, user=to_user_response(user))
-
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(payload.password, user.password_hash):
+            await db.commit()
+            await db.refresh(user)
+            usage_stats.record_user()
+        cached = to_cached_user(user)
+        user_cache.put(cached)
+        token = create_token(cached)
+        return AuthResponse(token=token, user=to_user_response(cached))
+
+    user = await db.scalar(select(User).where(User.email == email).limit(1))
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    try:
+        valid, new_hash = await password_hasher.verify(payload.password, user.password_hash)
+    except PasswordHasherBusy as exc:
+        raise _hashing_busy() from exc
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
+    if new_hash:
+        # Stored with older hashing parameters; upgrade now that the plaintext is at hand.
+        user.password_hash = new_hash
+        await db.commit()
 
-    token = create_token(user.id, user.email)
-    return AuthResponse(token=token, user=to_user_response(user))
+    # Clients poll right after logging in; warm the cache with the row just read.
+    cached = to_cached_user(user)
+    user_cache.put(cached)
+    token = create_token(cached)
+    return AuthResponse(token=token, user=to_user_response(cached))
 
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: CachedUser = Depends(get_token_user)):
     return to_user_response(current_user)
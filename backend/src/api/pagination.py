@@ -0,0 +1,91 @@
+import base64
+import binascii
+import json
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+# Page size for requests with neither cursor nor limit; 0 keeps the old
+# unpaginated responses for clients that predate pagination.
+LEGACY_PAGE_SIZE = int(os.getenv("LEGACY_PAGE_SIZE", "0"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+@dataclass
+class PageParams:
+    cursor: str | None
+    limit: int | None
+    include_total: bool
+
+
+def page_params(
+    cursor: str | None = Query(default=None, description="Opaque cursor from X-Next-Cursor"),
+    limit: int | None = Query(default=None, ge=1, le=PAGE_SIZE_MAX),
+    include_total: bool = False,
+) -> PageParams:
+    return PageParams(cursor=cursor, limit=limit, include_total=include_total)
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    raw = json.dumps([sort_value.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("utf-8").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError, binascii.Error) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from exc
+
+
+async def paginate(
+    db: AsyncSession,
+    query,
+    params: PageParams,
+    response: Response,
+    *,
+    sort_column,
+    id_column,
+    key: Callable[[object], tuple[datetime, int]],
+    descending: bool = False,
+    scalars: bool = True,
+) -> list:
+    """
+    Keyset pagination over (sort_column, id_column). `query` must already be
+    ordered by those two columns in the given direction; the next-page cursor
+    goes in X-Next-Cursor and the optional total in X-Total-Count.
+    """
+    if params.include_total:
+        total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        response.headers[TOTAL_COUNT_HEADER] = str(total or 0)
+
+    if params.cursor:
+        sort_value, last_id = decode_cursor(params.cursor)
+        if descending:
+            after = or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < last_id))
+        else:
+            after = or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > last_id))
+        query = query.where(after)
+
+    limit = params.limit or (PAGE_SIZE_DEFAULT if params.cursor else LEGACY_PAGE_SIZE)
+    if limit:
+        # One extra row tells us whether another page exists without a count.
+        query = query.limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = list(result.scalars().all() if scalars else result.all())
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
+    return rows
@@ -1,25 +1,54 @@
+import asyncio
+import json
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..models import ChatSession, Prompt, User
-from ..schemas import PromptCreateRequest, PromptResponse
-from ..services.gemini_test_service import generate_test_response
+from ..database import get_db, open_request_session
+from ..models import ChatSession, Prompt
+from ..schemas import (
+    PromptBatchRequest,
+    PromptBatchResponse,
+    PromptCreateRequest,
+    PromptResponse,
+)
+from ..services.conversation_context import assemble_context
+from ..services.gemini_test_service import agenerate_response
+from ..services.prompt_batch import PromptBatchRun, batch_parallelism
+from ..services.prompt_queue import PromptQueueFull, prompt_queue
+from ..services.prompt_stream import PromptStreamPump
+from ..services.usage_stats import usage_stats
+from ..services.user_cache import CachedUser
 from .auth import get_current_user
+from .pagination import PageParams, page_params, paginate
 
 
 router = APIRouter(prefix="/api/prompts", tags=["prompts"])
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+RESUME_POLL_SECONDS = 0.5
+
+
+def _sse_event(event: str, data: dict, event_id: int | None = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
 
 
 @router.post("", response_model=PromptResponse)
-def create_prompt(
+async def create_prompt(
     payload: PromptCreateRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    session = db.get(ChatSession, payload.session_id)
+    session = await db.get(ChatSession, payload.session_id)
     if not session or session.user_id != current_user.id or session.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
 
@@ -31,52 +60,262 @@ def create_prompt(
         status="processing",
         created_at=datetime.utcnow(),
     )
-    model_output, model_status = generate_test_response(payload.prompt)
-    prompt.response_text = model_output
-    prompt.status = model_status
+
+    if payload.async_mode:
+        # Persist first so the worker (and /api/results) can see the row.
+        db.add(prompt)
+        session.updated_at = datetime.utcnow()
+        await db.commit()
+        await db.refresh(prompt)
+        usage_stats.record_prompts_created()
+        try:
+            prompt_queue.submit(prompt.id)
+        except PromptQueueFull as exc:
+            await db.delete(prompt)
+            await db.commit()
+            usage_stats.record_prompt_deleted(prompt.created_at, prompt.status)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Prompt queue is full, retry later",
+            ) from exc
+        response.status_code = status.HTTP_202_ACCEPTED
+        return PromptResponse.model_validate(prompt)
+
+    prompt.started_at = prompt.created_at
+    context = await db.run_sync(assemble_context, session, prompt.prompt_text)
+    # Ends the transaction (and any summary write) before the model call.
+    await db.commit()
+    result = await agenerate_response(context.text, user_id=current_user.id, fallback_prompt=prompt.prompt_text)
+    prompt.response_text = result.text
+    prompt.status = result.status
+    prompt.queue_wait_ms = result.queue_wait_ms
+    prompt.context_tokens = context.context_tokens
+    prompt.completed_at = datetime.utcnow()
 
     db.add(prompt)
     session.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(prompt)
+    await db.commit()
+    await db.refresh(prompt)
+    usage_stats.record_prompts_created()
+    usage_stats.record_prompt_finished(prompt.created_at, prompt.status)
     return PromptResponse.model_validate(prompt)
 
 
-@router.get("/history", response_model=list[PromptResponse])
-def get_prompt_history(
-    session_id: int | None = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+@router.post("/batch", response_model=PromptBatchResponse)
+async def create_prompt_batch(
+    payload: PromptBatchRequest,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
+):
+    session = await db.get(ChatSession, payload.session_id)
+    if not session or session.user_id != current_user.id or session.deleted_at is not None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+
+    # One transaction for all rows; generation then updates each row independently.
+    now = datetime.utcnow()
+    prompts = [
+        Prompt(
+            user_id=current_user.id,
+            session_id=session.id,
+            prompt_text=text.strip(),
+            response_text=None,
+            status="processing",
+            created_at=now,
+        )
+        for text in payload.prompts
+    ]
+    db.add_all(prompts)
+    session.updated_at = now
+    # Flush assigns ids; snapshot before commit so nothing is reloaded row by row.
+    await db.flush()
+    rows = [PromptResponse.model_validate(prompt) for prompt in prompts]
+    await db.commit()
+    usage_stats.record_prompts_created(len(rows))
+    # Release the request's connection before the long-running fan-out.
+    await db.close()
+
+    # Submitted before the response goes out, so a client gone before the first byte strands nothing.
+    items = PromptBatchRun(rows, batch_parallelism(payload.parallelism))
+    if stream:
+
+        async def ndjson():
+            try:
+                while (item := await run_in_threadpool(next, items, None)) is not None:
+                    yield item.model_dump_json() + "\n"
+            finally:
+                # Shielded: a disconnect cancels this task, but queued rows must still be closed out.
+                await asyncio.shield(run_in_threadpool(items.close))
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = await run_in_threadpool(sorted, items, key=lambda item: item.index)
+    failed = sum(1 for item in results if item.error is not None)
+    return PromptBatchResponse(
+        session_id=payload.session_id,
+        completed=len(results) - failed,
+        failed=failed,
+        items=results,
+    )
+
+
+@router.post("/stream")
+async def stream_prompt(
+    payload: PromptCreateRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    query = (
-        db.query(Prompt)
-        .join(ChatSession, Prompt.session_id == ChatSession.id)
-        .filter(
-            Prompt.user_id == current_user.id,
-            ChatSession.user_id == current_user.id,
+    session = await db.get(ChatSession, payload.session_id)
+    if not session or session.user_id != current_user.id or session.deleted_at is not None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+
+    now = datetime.utcnow()
+    prompt = Prompt(
+        user_id=current_user.id,
+        session_id=session.id,
+        prompt_text=payload.prompt.strip(),
+        response_text=None,
+        status="processing",
+        created_at=now,
+        started_at=now,
+    )
+    db.add(prompt)
+    session.updated_at = now
+    await db.commit()
+    await db.refresh(prompt)
+    usage_stats.record_prompts_created()
+    prompt_id = prompt.id
+    # The stream can outlive the request's session; release it up front.
+    await db.close()
+
+    # Started before the response goes out: the row finishes even if the body is never sent.
+    pump = PromptStreamPump(prompt_id, prompt.prompt_text, current_user.id)
+    pump.start()
+
+    async def event_source():
+        offset = 0
+        try:
+            yield _sse_event("start", {"id": prompt_id}, event_id=offset)
+            while True:
+                event = await run_in_threadpool(pump.next_event, RESUME_POLL_SECONDS)
+                if event is None:
+                    if await request.is_disconnected():
+                        return
+                    continue
+                kind, value = event
+                if kind == "done":
+                    yield _sse_event("done", {"id": prompt_id, "status": value}, event_id=offset)
+                    return
+                offset += len(value)
+                yield _sse_event("chunk", {"text": value}, event_id=offset)
+        finally:
+            # Covers normal completion, disconnects and task cancellation alike.
+            pump.cancel()
+
+    return StreamingResponse(event_source(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.get("/{prompt_id}/stream")
+async def resume_prompt_stream(
+    prompt_id: int,
+    request: Request,
+    offset: int | None = None,
+    last_event_id: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
+):
+    row = await db.get(Prompt, prompt_id)
+    if not row or row.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
+    if row.session_id is not None:
+        session = await db.get(ChatSession, row.session_id)
+        if not session or session.user_id != current_user.id or session.deleted_at is not None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
+
+    # Event ids are character offsets into the response, so Last-Event-ID resumes exactly.
+    if offset is None:
+        offset = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    await db.close()
+
+    async def read_progress() -> tuple[str, str]:
+        # A fresh session per poll, so no connection is held between polls.
+        async with open_request_session() as poll_db:
+            current = await poll_db.get(Prompt, prompt_id)
+        if current is None:
+            return "", "error"
+        return current.response_text or "", current.status
+
+    async def event_source():
+        sent = offset
+        while True:
+            text, prompt_status = await read_progress()
+            if len(text) > sent:
+                yield _sse_event("chunk", {"text": text[sent:]}, event_id=len(text))
+                sent = len(text)
+            if prompt_status != "processing":
+                yield _sse_event("done", {"id": prompt_id, "status": prompt_status}, event_id=sent)
+                return
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(RESUME_POLL_SECONDS)
+
+    return StreamingResponse(event_source(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def prompt_history_query(user_id: int, session_id: int | None = None):
+    # Served by ix_prompts_user_session_created / ix_prompts_user_created without a sort step.
+    # EXISTS rather than a join, so the planner cannot drive from chat_sessions and sort.
+    live_session = (
+        select(ChatSession.id)
+        .where(
+            ChatSession.id == Prompt.session_id,
+            ChatSession.user_id == user_id,
             ChatSession.deleted_at.is_(None),
         )
+        .exists()
     )
+    query = select(Prompt).where(Prompt.user_id == user_id, live_session)
     if session_id is not None:
-        session = db.get(ChatSession, session_id)
+        query = query.where(Prompt.session_id == session_id)
+    return query.order_by(Prompt.created_at.asc(), Prompt.id.asc())
+
+
+@router.get("/history", response_model=list[PromptResponse])
+async def get_prompt_history(
+    response: Response,
+    session_id: int | None = None,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
+):
+    if session_id is not None:
+        session = await db.get(ChatSession, session_id)
         if not session or session.user_id != current_user.id or session.deleted_at is not None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-        query = query.filter(Prompt.session_id == session_id)
-    rows = query.order_by(Prompt.created_at.asc()).all()
+    rows = await paginate(
+        db,
+        prompt_history_query(current_user.id, session_id),
+        page,
+        response,
+        sort_column=Prompt.created_at,
+        id_column=Prompt.id,
+        key=lambda row: (row.created_at, row.id),
+    )
     return [PromptResponse.model_validate(row) for row in rows]
 
 
 @router.get("/{prompt_id}", response_model=PromptResponse)
-def get_prompt_by_id(
+async def get_prompt_by_id(
     prompt_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    row = db.get(Prompt, prompt_id)
+    row = await db.get(Prompt, prompt_id)
     if not row or row.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     if row.session_id is not None:
-        session = db.get(ChatSession, row.session_id)
+        session = await db.get(ChatSession, row.session_id)
         if not session or session.user_id != current_user.id or session.deleted_at is not None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Prompt not found")
     return PromptResponse.model_validate(row)
@@ -1,21 +1,52 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
-from ..models import Prompt, User
+from ..models import Prompt
+from ..services.prompt_queue import prompt_queue
+from ..services.user_cache import CachedUser
 from .auth import get_current_user
 
 
 router = APIRouter(prefix="/api/results", tags=["results"])
 
 
+def _progress_fields(row: Prompt) -> dict:
+    # Live worker state wins; otherwise derive progress from the persisted timestamps.
+    live = prompt_queue.job_state(row.id)
+    if live is not None:
+        progress = live["progress"]
+        queue_position = live["queue_position"]
+    elif row.status != "processing":
+        progress, queue_position = "done", None
+    elif row.started_at is None:
+        progress, queue_position = "queued", None
+    else:
+        progress, queue_position = "running", None
+
+    queue_exit = row.started_at or (datetime.utcnow() if progress == "queued" else None)
+    time_in_queue_ms = (
+        max(int((queue_exit - row.created_at).total_seconds() * 1000), 0)
+        if queue_exit is not None
+        else None
+    )
+    return {
+        "progress": progress,
+        "queue_position": queue_position,
+        "queue_depth": prompt_queue.depth(),
+        "time_in_queue_ms": time_in_queue_ms,
+    }
+
+
 @router.get("/{prompt_id}")
-def get_result(
+async def get_result(
     prompt_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    row = db.get(Prompt, prompt_id)
+    row = await db.get(Prompt, prompt_id)
     if not row or row.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Result not found")
 
@@ -24,4 +55,9 @@ def get_result(
         "status": row.status,
         "response": row.response_text,
         "created_at": row.created_at,
+        "started_at": row.started_at,
+        "completed_at": row.completed_at,
+        "provider_wait_ms": row.queue_wait_ms,
+        "context_tokens": row.context_tokens,
+        **_progress_fields(row),
     }
@@ -1,36 +1,61 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import get_db
-from ..models import ChatSession, User
-from ..schemas import SessionCreateRequest, SessionRenameRequest, SessionResponse
+from ..models import ChatSession
+from ..schemas import (
+    SessionBulkRequest,
+    SessionBulkResponse,
+    SessionBulkRetitleRequest,
+    SessionCreateRequest,
+    SessionRenameRequest,
+    SessionResponse,
+)
+from ..services.user_cache import CachedUser
 from .auth import get_current_user
+from .pagination import PageParams, page_params, paginate
 
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
 
+def session_list_query(user_id: int):
+    # Served by ix_chat_sessions_user_deleted_updated without a sort step.
+    return (
+        select(ChatSession)
+        .where(ChatSession.user_id == user_id, ChatSession.deleted_at.is_(None))
+        .order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+    )
+
+
 @router.get("", response_model=list[SessionResponse])
-def list_sessions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+async def list_sessions(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    rows = (
-        db.query(ChatSession)
-        .filter(ChatSession.user_id == current_user.id, ChatSession.deleted_at.is_(None))
-        .order_by(ChatSession.updated_at.desc())
-        .all()
+    rows = await paginate(
+        db,
+        session_list_query(current_user.id),
+        page,
+        response,
+        sort_column=ChatSession.updated_at,
+        id_column=ChatSession.id,
+        key=lambda row: (row.updated_at, row.id),
+        descending=True,
     )
     return [SessionResponse.model_validate(row) for row in rows]
 
 
 @router.post("", response_model=SessionResponse)
-def create_session(
+async def create_session(
     payload: SessionCreateRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
     row = ChatSession(
         user_id=current_user.id,
@@ -39,60 +64,116 @@ def create_session(
         updated_at=datetime.utcnow(),
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
     return SessionResponse.model_validate(row)
 
 
 @router.post("/clear", status_code=status.HTTP_200_OK)
-def clear_sessions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+async def clear_sessions(
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
+):
+    now = datetime.utcnow()
+    result = await db.execute(
+        _bulk_update(current_user.id).values(deleted_at=now, updated_at=now)
+    )
+    await db.commit()
+    return {"hidden_sessions": result.rowcount}
+
+
+def _bulk_update(user_id: int, session_ids: list[int] | None = None, deleted: bool = False):
+    """One UPDATE over the user's live (or deleted) sessions; rows are never loaded."""
+    statement = update(ChatSession).where(
+        ChatSession.user_id == user_id,
+        ChatSession.deleted_at.is_not(None) if deleted else ChatSession.deleted_at.is_(None),
+    )
+    if session_ids is not None:
+        statement = statement.where(ChatSession.id.in_(session_ids))
+    return statement.execution_options(synchronize_session=False)
+
+
+@router.post("/bulk/delete", response_model=SessionBulkResponse)
+async def bulk_delete_sessions(
+    payload: SessionBulkRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
+):
+    session_ids = sorted(set(payload.session_ids))
+    now = datetime.utcnow()
+    result = await db.execute(
+        _bulk_update(current_user.id, session_ids).values(deleted_at=now, updated_at=now)
+    )
+    await db.commit()
+    return SessionBulkResponse(requested=len(session_ids), affected=result.rowcount)
+
+
+@router.post("/bulk/restore", response_model=SessionBulkResponse)
+async def bulk_restore_sessions(
+    payload: SessionBulkRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
+):
+    session_ids = sorted(set(payload.session_ids))
+    result = await db.execute(
+        _bulk_update(current_user.id, session_ids, deleted=True).values(
+            deleted_at=None,
+            updated_at=datetime.utcnow(),
+        )
+    )
+    await db.commit()
+    return SessionBulkResponse(requested=len(session_ids), affected=result.rowcount)
+
+
+@router.post("/bulk/retitle", response_model=SessionBulkResponse)
+async def bulk_retitle_sessions(
+    payload: SessionBulkRetitleRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
+    session_ids = sorted(set(payload.session_ids))
     now = datetime.utcnow()
-    rows = (
-        db.query(ChatSession)
-        .filter(ChatSession.user_id == current_user.id, ChatSession.deleted_at.is_(None))
-        .all()
+    result = await db.execute(
+        _bulk_update(current_user.id, session_ids).values(
+            title=payload.title.strip(),
+            updated_at=now,
+            renamed_at=now,
+        )
     )
-    for row in rows:
-        row.deleted_at = now
-        row.updated_at = now
-        db.add(row)
-    db.commit()
-    return {"hidden_sessions": len(rows)}
+    await db.commit()
+    return SessionBulkResponse(requested=len(session_ids), affected=result.rowcount)
 
 
 @router.patch("/{session_id}", response_model=SessionResponse)
-def rename_session(
+async def rename_session(
     session_id: int,
     payload: SessionRenameRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    row = db.get(ChatSession, session_id)
+    row = await db.get(ChatSession, session_id)
     if not row or row.user_id != current_user.id or row.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
 
     row.title = payload.title.strip()
     row.updated_at = datetime.utcnow()
     row.renamed_at = datetime.utcnow()
-    db.commit()
-    db.refresh(row)
+    await db.commit()
+    await db.refresh(row)
     return SessionResponse.model_validate(row)
 
 
 @router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_session(
+async def delete_session(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: CachedUser = Depends(get_current_user),
 ):
-    row = db.get(ChatSession, session_id)
+    row = await db.get(ChatSession, session_id)
     if not row or row.user_id != current_user.id or row.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
 
     row.deleted_at = datetime.utcnow()
     row.updated_at = datetime.utcnow()
     db.add(row)
-    db.commit()
+    await db.commit()
@@ -1,8 +1,18 @@
+import asyncio
+import hashlib
+import itertools
 import os
+import threading
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from sqlalchemy import create_engine, inspect, text
-from sqlalchemy.orm import declarative_base, sessionmaker
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 
 Base = declarative_base()
@@ -36,47 +46,452 @@ def build_database_url() -> str:
 
 DATABASE_URL = build_database_url()
 IS_SQLITE = DATABASE_URL.startswith("sqlite")
+# In-memory SQLite keeps SQLAlchemy's default single-connection pool.
+IS_SQLITE_MEMORY = IS_SQLITE and (DATABASE_URL in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in DATABASE_URL)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "10"))
+DB_POOL_SATURATION_WARN = float(os.getenv("DB_POOL_SATURATION_WARN", "0.9"))
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Negative values are KiB, positive values are pages (SQLite semantics).
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class _WaitTimingMixin:
+    """Pool mixin that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.waits = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - started) * 1000
+            with self._stats_lock:
+                self.waits += 1
+                self.total_wait_ms += waited_ms
+                self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+
+    def wait_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "checkouts": self.waits,
+                "avg_wait_ms": round(self.total_wait_ms / self.waits, 2) if self.waits else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 2),
+                "timeouts": self.timeouts,
+            }
+
+
+class TimedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _async_driver_url(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    if scheme in ("sqlite", "sqlite+pysqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme.startswith("mysql") and scheme not in ("mysql+aiomysql", "mysql+asyncmy"):
+        return f"mysql+aiomysql://{rest}"
+    return url
+
+
+def build_async_database_url(url: str) -> str:
+    explicit_url = os.getenv("ASYNC_DATABASE_URL", "").strip()
+    return explicit_url or _async_driver_url(url)
+
+
+# Request handlers use the async engine by default; DB_ASYNC_MODE=false serves
+# them from the sync engine through SyncSessionAdapter instead. Background
+# workers always use the sync engine. An in-memory SQLite database cannot be
+# shared between two engines, so it forces sync mode.
+DB_ASYNC_MODE = os.getenv("DB_ASYNC_MODE", "true").lower() == "true" and not IS_SQLITE_MEMORY
+ASYNC_DATABASE_URL = build_async_database_url(DATABASE_URL)
+
+# Optional read replicas (comma-separated URLs) for GET requests. A client's
+# reads stay on the primary for DB_REPLICA_STICKY_SECONDS after its own write.
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+READ_METHODS = ("GET", "HEAD")
+
+
+def _engine_kwargs(poolclass) -> dict:
+    if IS_SQLITE_MEMORY:
+        return {"connect_args": {"check_same_thread": False}}
+
+    kwargs = {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if IS_SQLITE:
+        # busy_timeout is also set by pragma; the driver timeout covers the connect itself.
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    else:
+        kwargs["pool_recycle"] = DB_POOL_RECYCLE_SECONDS
+        kwargs["connect_args"] = {"connect_timeout": DB_CONNECT_TIMEOUT_SECONDS}
+    return kwargs
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        if not IS_SQLITE_MEMORY:
+            # WAL lets readers proceed while a writer holds the lock.
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+
+def _create_engines(url: str, async_url: str):
+    sync_engine = create_engine(url, **_engine_kwargs(TimedQueuePool))
+    async_engine = (
+        create_async_engine(async_url, **_engine_kwargs(TimedAsyncQueuePool))
+        if DB_ASYNC_MODE
+        else None
+    )
+    if IS_SQLITE:
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+        if async_engine is not None:
+            event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return sync_engine, async_engine
+
+
+engine, async_engine = _create_engines(DATABASE_URL, ASYNC_DATABASE_URL)
+
+
+def _pool_snapshot(pool) -> dict:
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    stats = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+    if isinstance(pool, _WaitTimingMixin):
+        stats.update(pool.wait_stats())
+    return stats
+
+
+def pool_stats() -> dict:
+    """Stats for the pool serving requests, plus the worker pool in async mode and any replicas."""
+    if async_engine is None:
+        stats = {"mode": "sync", **_pool_snapshot(engine.pool)}
+    else:
+        stats = {
+            "mode": "async",
+            **_pool_snapshot(async_engine.pool),
+            "background": _pool_snapshot(engine.pool),
+        }
+    if read_replicas:
+        stats["replicas"] = [replica.snapshot() for replica in read_replicas]
+    return stats
+
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if IS_SQLITE else {},
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Request sessions keep attributes loaded after commit: in async mode a lazy
+# refresh would need IO outside the awaited call.
+RequestSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None
+    else None
+)
 
 
-def get_db():
-    db = SessionLocal()
+class ReadReplica:
+    """Engines and request session factories for one read-only replica."""
+
+    def __init__(self, index: int, url: str):
+        self.name = f"replica-{index}"
+        self.engine, self.async_engine = _create_engines(url, _async_driver_url(url))
+        self.session_factory = sessionmaker(
+            autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine
+        )
+        self.async_session_factory = (
+            async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+            if self.async_engine is not None
+            else None
+        )
+        self.reads = 0
+
+    def snapshot(self) -> dict:
+        pool = self.async_engine.pool if self.async_engine is not None else self.engine.pool
+        with _replica_lock:
+            reads = self.reads
+        return {"name": self.name, "reads": reads, **_pool_snapshot(pool)}
+
+
+read_replicas = [ReadReplica(index, url) for index, url in enumerate(DATABASE_REPLICA_URLS)]
+_replica_turn = itertools.count()
+# Guards the per-replica read counters; requests pick replicas from many threads in sync mode.
+_replica_lock = threading.Lock()
+
+
+class ReadYourWrites:
+    """Remembers clients that wrote recently so their reads skip the (possibly lagging) replicas."""
+
+    def __init__(self, sticky_seconds: float):
+        self._sticky_seconds = sticky_seconds
+        self._lock = threading.Lock()
+        self._until: dict[str, float] = {}
+        self.primary_reads = 0
+
+    def mark(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._until[key] = now + self._sticky_seconds
+            if len(self._until) > 10_000:
+                self._until = {k: until for k, until in self._until.items() if until > now}
+
+    def is_sticky(self, key: str) -> bool:
+        with self._lock:
+            until = self._until.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self._until[key]
+                return False
+            self.primary_reads += 1
+            return True
+
+
+read_your_writes = ReadYourWrites(DB_REPLICA_STICKY_SECONDS)
+
+
+def _client_key(request: Request) -> str:
+    # The bearer token identifies the user without a DB lookup; only its digest is kept.
+    credential = request.headers.get("authorization") or (request.client.host if request.client else "")
+    return hashlib.sha256(credential.encode()).hexdigest()
+
+
+def pick_read_replica() -> ReadReplica | None:
+    """Round-robin replica for a read, or None to read from the primary."""
+    if not read_replicas:
+        return None
+    with _replica_lock:
+        replica = read_replicas[next(_replica_turn) % len(read_replicas)]
+        replica.reads += 1
+    return replica
+
+
+class SyncSessionAdapter:
+    """
+    Gives a sync Session the awaitable surface of AsyncSession, so the same
+    async route code runs in sync mode; each round trip goes to the threadpool.
+    """
+
+    def __init__(self, session: Session, release=None):
+        self.sync_session = session
+        self._release = release
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def refresh(self, instance, *args, **kwargs) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, *args, **kwargs) -> None:
+        await run_in_threadpool(self.sync_session.flush, *args, **kwargs)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        try:
+            await run_in_threadpool(self.sync_session.close)
+        finally:
+            if self._release is not None:
+                release, self._release = self._release, None
+                release()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        statement = statement.execution_options(stream_results=True)
+        result = await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+        return _ThreadedStreamResult(result)
+
+
+class _ThreadedStreamResult:
+    """The partitions() half of AsyncResult, fetching from a sync cursor in the threadpool."""
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size: int | None = None):
+        try:
+            while True:
+                rows = await run_in_threadpool(self._result.fetchmany, size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            await run_in_threadpool(self._result.close)
+
+
+_sync_request_slots: dict[str | None, asyncio.Semaphore] = {}
+
+
+def _request_slots(pool_name: str | None = None) -> asyncio.Semaphore:
+    # Sync mode: a request holding a connection needs a threadpool thread for
+    # each round trip. Without this cap, requests blocked on pool checkout can
+    # occupy every thread and starve the ones that hold connections.
+    if pool_name not in _sync_request_slots:
+        _sync_request_slots[pool_name] = asyncio.Semaphore(max(DB_POOL_SIZE + max(DB_MAX_OVERFLOW, 0), 1))
+    return _sync_request_slots[pool_name]
+
+
+@asynccontextmanager
+async def open_request_session(replica: ReadReplica | None = None):
+    async_factory = replica.async_session_factory if replica is not None else AsyncSessionLocal
+    if async_factory is not None:
+        async with async_factory() as db:
+            yield db
+        return
+
+    slots = _request_slots(replica.name if replica is not None else None)
+    await slots.acquire()
+    sync_factory = replica.session_factory if replica is not None else RequestSessionLocal
+    db = SyncSessionAdapter(sync_factory(), release=slots.release)
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
 
 
-def init_db() -> None:
-    from . import models  # noqa: F401
+async def fetch_by_id(entity, ident):
+    """
+    Primary-key lookup in its own short session, for dependencies resolved next
+    to the request session. In sync mode it is one threadpool call, so no
+    connection is held across awaits, behind its own slot pool, so it never
+    waits on a slot its own request holds.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.get(entity, ident)
 
-    Base.metadata.create_all(bind=engine)
-    _run_lightweight_migrations()
+    def load():
+        with RequestSessionLocal() as db:
+            return db.get(entity, ident)
 
+    async with _request_slots("lookup"):
+        return await run_in_threadpool(load)
 
-def _run_lightweight_migrations() -> None:
-    inspector = inspect(engine)
-    table_names = set(inspector.get_table_names())
-    if "prompts" not in table_names:
+
+async def get_db(request: Request):
+    """
+    Request session routed by method: GET/HEAD read from a replica when one is
+    configured, unless the client wrote within DB_REPLICA_STICKY_SECONDS;
+    everything else uses the primary and starts that window.
+    """
+    if not read_replicas:
+        async with open_request_session() as db:
+            yield db
+        return
+
+    key = _client_key(request)
+    if request.method in READ_METHODS:
+        replica = None if read_your_writes.is_sticky(key) else pick_read_replica()
+        async with open_request_session(replica) as db:
+            yield db
         return
 
-    prompt_columns = {column["name"] for column in inspector.get_columns("prompts")}
-    with engine.begin() as connection:
-        if "session_id" not in prompt_columns:
-            connection.execute(text("ALTER TABLE prompts ADD COLUMN session_id INTEGER"))
-
-    if "chat_sessions" in table_names:
-        session_columns = {column["name"] for column in inspector.get_columns("chat_sessions")}
-        with engine.begin() as connection:
-            if "deleted_at" not in session_columns:
-                connection.execute(text("ALTER TABLE chat_sessions ADD COLUMN deleted_at DATETIME"))
-            if "renamed_at" not in session_columns:
-                connection.execute(text("ALTER TABLE chat_sessions ADD COLUMN renamed_at DATETIME"))
+    read_your_writes.mark(key)
+    try:
+        async with open_request_session() as db:
+            yield db
+    finally:
+        # Measured from the end of the write too, for requests longer than the window.
+        read_your_writes.mark(key)
+
+
+def get_sync_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def dispose_engines() -> None:
+    for replica in read_replicas:
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
+        replica.engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+
+def init_db() -> None:
+    from . import models  # noqa: F401
+    from .migrations import run_migrations
+    from .services import text_storage  # noqa: F401  (installs the flush hook when enabled)
+
+    run_migrations(engine)
 
 
 def get_database_mode() -> str:
@@ -0,0 +1,138 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .database import Base
+from .models import SchemaVersion
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _add_missing_columns(connection: Connection, table: str, columns: dict[str, str]) -> None:
+    # Steps can run on databases that create_all just built, so existing columns are skipped.
+    existing = {column["name"] for column in inspect(connection).get_columns(table)}
+    for name, ddl_type in columns.items():
+        if name not in existing:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+
+def _v1_sessions(connection: Connection) -> None:
+    _add_missing_columns(connection, "prompts", {"session_id": "INTEGER"})
+    _add_missing_columns(connection, "chat_sessions", {"deleted_at": "DATETIME", "renamed_at": "DATETIME"})
+
+
+def _v2_prompt_timing(connection: Connection) -> None:
+    _add_missing_columns(
+        connection,
+        "prompts",
+        {"started_at": "DATETIME", "completed_at": "DATETIME", "queue_wait_ms": "INTEGER"},
+    )
+
+
+def _v3_conversation_context(connection: Connection) -> None:
+    _add_missing_columns(connection, "prompts", {"context_tokens": "INTEGER"})
+    _add_missing_columns(
+        connection,
+        "chat_sessions",
+        {"context_summary": "TEXT", "summarized_through_id": "INTEGER"},
+    )
+
+
+def _create_model_indexes(connection: Connection, *index_names: str) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in index_names:
+                index.create(bind=connection, checkfirst=True)
+
+
+def _v4_hot_query_indexes(connection: Connection) -> None:
+    _create_model_indexes(
+        connection,
+        "ix_chat_sessions_user_deleted_updated",
+        "ix_prompts_user_session_created",
+        "ix_prompts_user_created",
+    )
+
+
+def _v5_admin_listing_indexes(connection: Connection) -> None:
+    _create_model_indexes(connection, "ix_users_created", "ix_prompts_created")
+
+
+def _v6_usage_rollups(connection: Connection) -> None:
+    # create_all made the tables; seed them once from the raw rows.
+    from .services.usage_stats import rebuild_rollups
+
+    rebuild_rollups(connection)
+
+
+def _v7_text_blobs(connection: Connection) -> None:
+    # text_blobs comes from create_all; existing bodies move over via migrate_inline_bodies.
+    _add_missing_columns(
+        connection,
+        "prompts",
+        {"prompt_blob_digest": "VARCHAR(64)", "response_blob_digest": "VARCHAR(64)"},
+    )
+
+
+MIGRATIONS = [
+    Migration(1, "session columns on prompts and chat_sessions", _v1_sessions),
+    Migration(2, "prompt queue timing columns", _v2_prompt_timing),
+    Migration(3, "conversation context columns", _v3_conversation_context),
+    Migration(4, "composite indexes for session list and prompt history", _v4_hot_query_indexes),
+    Migration(5, "created_at indexes for admin listings", _v5_admin_listing_indexes),
+    Migration(6, "usage rollup tables for the admin overview", _v6_usage_rollups),
+    Migration(7, "blob references for deduplicated prompt and response bodies", _v7_text_blobs),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(engine: Engine) -> int | None:
+    """The applied schema version, or None when there is no schema_version table yet."""
+    try:
+        with engine.connect() as connection:
+            # Plain SQL: an ORM select here would configure every mapper on the startup path.
+            return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except exc.DBAPIError:
+        return None
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """
+    Brings the schema up to LATEST_VERSION and returns the versions applied.
+    The fast path is one version read; reflection and create_all only happen
+    when something is pending.
+    """
+    if current_version(engine) == LATEST_VERSION:
+        return []
+
+    # New tables (and all columns of them) come from the models; steps patch older tables.
+    Base.metadata.create_all(bind=engine)
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= (current_version(engine) or 0):
+            continue
+        try:
+            with engine.begin() as connection:
+                migration.apply(connection)
+                connection.execute(
+                    SchemaVersion.__table__.insert().values(
+                        version=migration.version,
+                        description=migration.description,
+                        applied_at=datetime.utcnow(),
+                    )
+                )
+        except exc.DBAPIError:
+            # Another worker starting at the same time may have applied this step first.
+            if (current_version(engine) or 0) < migration.version:
+                raise
+            continue
+        applied.append(migration.version)
+    return applied
@@ -1,6 +1,9 @@
+import zlib
 from datetime import datetime
+from functools import cached_property
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -8,6 +11,10 @@ from .database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Admin user listing, newest first.
+        Index("ix_users_created", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
@@ -29,6 +36,10 @@ class User(Base):
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # Session list: user_id = ? AND deleted_at IS NULL ORDER BY updated_at.
+        Index("ix_chat_sessions_user_deleted_updated", "user_id", "deleted_at", "updated_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
@@ -37,6 +48,8 @@ class ChatSession(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     renamed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=None)
     deleted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=None)
+    context_summary: Mapped[str | None] = mapped_column(Text, nullable=True, default=None)
+    summarized_through_id: Mapped[int | None] = mapped_column(Integer, nullable=True, default=None)
 
     user: Mapped[User] = relationship("User", back_populates="sessions")
     prompts: Mapped[list["Prompt"]] = relationship(
@@ -46,16 +59,149 @@ class ChatSession(Base):
     )
 
 
+class TextBlob(Base):
+    """A prompt or response body stored once per distinct content (sha256 of the UTF-8 text)."""
+
+    __tablename__ = "text_blobs"
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # "zlib" or "raw"; raw when compression would not make the body smaller.
+    codec: Mapped[str] = mapped_column(String(16), nullable=False)
+    # The length makes MySQL pick LONGBLOB; plain BLOB stops at 64 KiB.
+    data: Mapped[bytes] = mapped_column(LargeBinary(length=2**32 - 1), nullable=False)
+    original_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
+    stored_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    @staticmethod
+    def decode(codec: str, data: bytes) -> str:
+        return (zlib.decompress(data) if codec == "zlib" else data).decode("utf-8")
+
+    @cached_property
+    def text(self) -> str:
+        return self.decode(self.codec, self.data)
+
+
 class Prompt(Base):
     __tablename__ = "prompts"
+    __table_args__ = (
+        # Prompt history, with and without a session filter, ordered by created_at.
+        Index("ix_prompts_user_session_created", "user_id", "session_id", "created_at"),
+        Index("ix_prompts_user_created", "user_id", "created_at"),
+        # Admin prompt listing across all users, newest first.
+        Index("ix_prompts_created", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
     session_id: Mapped[int | None] = mapped_column(ForeignKey("chat_sessions.id"), nullable=True, index=True)
-    prompt_text: Mapped[str] = mapped_column(Text, nullable=False)
-    response_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Inline bodies. With text storage enabled, large bodies move to text_blobs
+    # and the inline column is left as "" (see services/text_storage.py).
+    prompt_inline: Mapped[str] = mapped_column("prompt_text", Text, nullable=False)
+    response_inline: Mapped[str | None] = mapped_column("response_text", Text, nullable=True)
+    prompt_blob_digest: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("text_blobs.digest"), nullable=True, default=None
+    )
+    response_blob_digest: Mapped[str | None] = mapped_column(
+        String(64), ForeignKey("text_blobs.digest"), nullable=True, default=None
+    )
     status: Mapped[str] = mapped_column(String(50), default="saved", nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=None)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=None)
+    queue_wait_ms: Mapped[int | None] = mapped_column(Integer, nullable=True, default=None)
+    context_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True, default=None)
 
     user: Mapped[User] = relationship("User", back_populates="prompts")
     session: Mapped[ChatSession | None] = relationship("ChatSession", back_populates="prompts")
+    # Loaded with the prompt (no query when the digests are NULL), so reads never lazy-load.
+    prompt_blob: Mapped[TextBlob | None] = relationship(foreign_keys=[prompt_blob_digest], lazy="selectin")
+    response_blob: Mapped[TextBlob | None] = relationship(foreign_keys=[response_blob_digest], lazy="selectin")
+
+    def _body(self, field: str) -> str | None:
+        # A body set on this instance wins over whatever storage form it was flushed to.
+        if f"_{field}_plain" in self.__dict__:
+            return self.__dict__[f"_{field}_plain"]
+        blob = getattr(self, f"{field}_blob") if getattr(self, f"{field}_blob_digest") else None
+        return blob.text if blob is not None else getattr(self, f"{field}_inline")
+
+    def _set_body(self, field: str, value: str | None) -> None:
+        self.__dict__[f"_{field}_plain"] = value
+        setattr(self, f"{field}_inline", value)
+        setattr(self, f"{field}_blob_digest", None)
+
+    # In SQL these are the inline columns, which hold "" for blob-stored bodies;
+    # select Prompt entities (or join text_blobs) to read the full text.
+    @hybrid_property
+    def prompt_text(self) -> str:
+        return self._body("prompt")
+
+    @prompt_text.inplace.setter
+    def _prompt_text_setter(self, value: str) -> None:
+        self._set_body("prompt", value)
+
+    @prompt_text.inplace.expression
+    @classmethod
+    def _prompt_text_expression(cls):
+        return cls.prompt_inline
+
+    @hybrid_property
+    def response_text(self) -> str | None:
+        return self._body("response")
+
+    @response_text.inplace.setter
+    def _response_text_setter(self, value: str | None) -> None:
+        self._set_body("response", value)
+
+    @response_text.inplace.expression
+    @classmethod
+    def _response_text_expression(cls):
+        return cls.response_inline
+
+
+class ResponseCacheEntry(Base):
+    __tablename__ = "response_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model_name: Mapped[str] = mapped_column(String(120), nullable=False)
+    response_text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+class UsageTotal(Base):
+    __tablename__ = "usage_totals"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class PromptRollup(Base):
+    """Finished prompts per (granularity, bucket, status); bucketed by created_at."""
+
+    __tablename__ = "prompt_rollups"
+
+    granularity: Mapped[str] = mapped_column(String(8), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    status: Mapped[str] = mapped_column(String(50), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ModelLatencyRollup(Base):
+    """Hourly generation latency histogram per model, one row per bucket."""
+
+    __tablename__ = "model_latency_rollups"
+
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    model_name: Mapped[str] = mapped_column(String(120), primary_key=True)
+    # Bucket upper bound in ms; -1 is the open-ended bucket.
+    le_ms: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    description: Mapped[str] = mapped_column(String(255), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
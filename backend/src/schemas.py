@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Annotated
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -32,6 +33,7 @@ class AuthResponse(BaseModel):
 class PromptCreateRequest(BaseModel):
     prompt: str = Field(min_length=1, max_length=8000)
     session_id: int
+    async_mode: bool = False
 
 
 class PromptResponse(BaseModel):
@@ -44,6 +46,27 @@ class PromptResponse(BaseModel):
     response_text: str | None
     status: str
     created_at: datetime
+    queue_wait_ms: int | None = None
+    context_tokens: int | None = None
+
+
+class PromptBatchRequest(BaseModel):
+    session_id: int
+    prompts: list[Annotated[str, Field(min_length=1, max_length=8000)]] = Field(min_length=1, max_length=500)
+    parallelism: int | None = Field(default=None, ge=1, le=64)
+
+
+class PromptBatchItem(BaseModel):
+    index: int
+    prompt: PromptResponse
+    error: str | None = None
+
+
+class PromptBatchResponse(BaseModel):
+    session_id: int
+    completed: int
+    failed: int
+    items: list[PromptBatchItem]
 
 
 class SessionCreateRequest(BaseModel):
@@ -54,6 +77,19 @@ class SessionRenameRequest(BaseModel):
     title: str = Field(min_length=1, max_length=200)
 
 
+class SessionBulkRequest(BaseModel):
+    session_ids: list[int] = Field(min_length=1, max_length=1000)
+
+
+class SessionBulkRetitleRequest(SessionBulkRequest):
+    title: str = Field(min_length=1, max_length=200)
+
+
+class SessionBulkResponse(BaseModel):
+    requested: int
+    affected: int
+
+
 class SessionResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
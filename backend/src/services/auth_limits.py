@@ -0,0 +1,236 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+
+
+AUTH_LIMIT_ENABLED = os.getenv("AUTH_LIMIT_ENABLED", "true").lower() == "true"
+AUTH_LIMIT_WINDOW_SECONDS = float(os.getenv("AUTH_LIMIT_WINDOW_SECONDS", "300"))
+AUTH_LIMIT_PER_EMAIL = int(os.getenv("AUTH_LIMIT_PER_EMAIL", "10"))
+AUTH_LIMIT_PER_IP = int(os.getenv("AUTH_LIMIT_PER_IP", "50"))
+# "memory" keeps counts per process; "sqlite:///path/to/limits.db" shares them between workers on one host.
+AUTH_LIMIT_STORE = os.getenv("AUTH_LIMIT_STORE", "memory")
+AUTH_LIMIT_MAX_KEYS = int(os.getenv("AUTH_LIMIT_MAX_KEYS", "100000"))
+_PRUNE_EVERY = 1000
+
+
+class AttemptStore(ABC):
+    """
+    Per-key attempt counts in fixed windows, read back as (previous, current)
+    so the limiter can weight them into a sliding window. Keys are
+    "<scope>:<digest>", never raw emails or addresses.
+    """
+
+    # True when hit() does file or network IO and should stay off the event loop.
+    blocking = False
+
+    @abstractmethod
+    def hit(self, key: str, window: int) -> tuple[int, int]:
+        """Counts one attempt for key in window; returns (previous window, current window) counts."""
+
+    @abstractmethod
+    def windows(self, window: int) -> dict[str, tuple[int, int]]:
+        """(previous, current) counts of every key seen in the last two windows."""
+
+
+class MemoryAttemptStore(AttemptStore):
+    def __init__(self, max_keys: int):
+        self._max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        # key -> (window, previous, current), least recently hit first.
+        self._counts: OrderedDict[str, tuple[int, int, int]] = OrderedDict()
+
+    @staticmethod
+    def _roll(entry: tuple[int, int, int] | None, window: int) -> tuple[int, int]:
+        if entry is None or entry[0] < window - 1:
+            return 0, 0
+        if entry[0] == window - 1:
+            return entry[2], 0
+        return entry[1], entry[2]
+
+    def hit(self, key: str, window: int) -> tuple[int, int]:
+        with self._lock:
+            previous, current = self._roll(self._counts.get(key), window)
+            self._counts[key] = (window, previous, current + 1)
+            self._counts.move_to_end(key)
+            while len(self._counts) > self._max_keys:
+                self._counts.popitem(last=False)
+        return previous, current + 1
+
+    def windows(self, window: int) -> dict[str, tuple[int, int]]:
+        with self._lock:
+            for key in [key for key, entry in self._counts.items() if entry[0] < window - 1]:
+                del self._counts[key]
+            return {key: self._roll(entry, window) for key, entry in self._counts.items()}
+
+
+class SqliteAttemptStore(AttemptStore):
+    """Counts in a local SQLite file, so every worker on the host shares one set of limits."""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        self._hits = 0
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS auth_attempts ("
+                "key TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (key, bucket))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key: str, window: int) -> tuple[int, int]:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO auth_attempts (key, bucket, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (key, bucket) DO UPDATE SET count = count + 1",
+                (key, window),
+            )
+            counts = dict(
+                connection.execute(
+                    "SELECT bucket, count FROM auth_attempts WHERE key = ? AND bucket >= ?",
+                    (key, window - 1),
+                ).fetchall()
+            )
+            self._hits += 1
+            if self._hits % _PRUNE_EVERY == 0:
+                connection.execute("DELETE FROM auth_attempts WHERE bucket < ?", (window - 1,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return counts.get(window - 1, 0), counts.get(window, 0)
+
+    def windows(self, window: int) -> dict[str, tuple[int, int]]:
+        per_key: dict[str, list[int]] = {}
+        rows = self._connect().execute(
+            "SELECT key, bucket, count FROM auth_attempts WHERE bucket >= ?", (window - 1,)
+        )
+        for key, bucket, count in rows:
+            per_key.setdefault(key, [0, 0])[bucket - window + 1] = count
+        return {key: (previous, current) for key, (previous, current) in per_key.items()}
+
+
+def build_store(spec: str) -> AttemptStore:
+    if spec.startswith("sqlite:///"):
+        return SqliteAttemptStore(spec[len("sqlite:///"):])
+    if spec != "memory":
+        raise ValueError(f"Unknown AUTH_LIMIT_STORE: {spec}")
+    return MemoryAttemptStore(AUTH_LIMIT_MAX_KEYS)
+
+
+class AuthRateLimited(Exception):
+    def __init__(self, scope: str, retry_after: int):
+        super().__init__(f"Too many attempts for this {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class AuthRateLimiter:
+    """
+    Sliding-window limits on login and registration attempts, per client IP
+    and per email. The window is approximated from two fixed windows: the
+    previous window's count is weighted by how much of it still overlaps.
+    Every attempt counts, rejected ones included, so hammering keeps a key
+    blocked rather than earning a retry each window.
+    """
+
+    def __init__(self, store: AttemptStore, window_seconds: float, per_email: int, per_ip: int, enabled: bool = True):
+        self.store = store
+        self._window = max(window_seconds, 1.0)
+        self._limits = {"ip": per_ip, "email": per_email}
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+
+    def _key(self, action: str, scope: str, value: str) -> str:
+        return f"{scope}:" + hashlib.sha256(f"{action}:{value}".encode("utf-8")).hexdigest()
+
+    def _estimate(self, previous: int, current: int, elapsed: float) -> float:
+        return previous * (1 - elapsed) + current
+
+    def _retry_after(self, previous: int, current: int, elapsed: float, limit: int) -> int:
+        if current < limit and previous:
+            # Wait until enough of the previous window has slid out.
+            seconds = (1 - (limit - current) / previous - elapsed) * self._window
+        else:
+            # The current window alone is over; wait for it to become "previous" and decay.
+            seconds = (1 - elapsed + (1 - limit / max(current, 1))) * self._window
+        return max(1, math.ceil(seconds))
+
+    def check(self, action: str, email: str, client_ip: str) -> None:
+        """Counts one attempt; raises AuthRateLimited if the IP or the email is over its limit."""
+        if not self._enabled:
+            return
+        now = time.time()
+        window = int(now // self._window)
+        elapsed = now / self._window - window
+        for scope, value in (("ip", client_ip), ("email", email)):
+            limit = self._limits[scope]
+            if limit <= 0:
+                continue
+            previous, current = self.store.hit(self._key(action, scope, value), window)
+            if self._estimate(previous, current, elapsed) > limit:
+                with self._lock:
+                    self._counters[f"{action}_rejected_{scope}"] += 1
+                raise AuthRateLimited(scope, self._retry_after(previous, current, elapsed, limit))
+        with self._lock:
+            self._counters[f"{action}_allowed"] += 1
+
+    def stats(self) -> dict:
+        """Counters plus, per scope, how full the windows are: keys tracked, past half their limit, and over it."""
+        now = time.time()
+        window = int(now // self._window)
+        elapsed = now / self._window - window
+        occupancy = {
+            scope: {"tracked_keys": 0, "over_half": 0, "over_limit": 0, "max_ratio": 0.0}
+            for scope, limit in self._limits.items()
+            if limit > 0
+        }
+        if self._enabled:
+            for key, (previous, current) in self.store.windows(window).items():
+                scope = key.split(":", 1)[0]
+                if scope not in occupancy:
+                    continue
+                ratio = self._estimate(previous, current, elapsed) / self._limits[scope]
+                if ratio <= 0:
+                    continue
+                entry = occupancy[scope]
+                entry["tracked_keys"] += 1
+                entry["over_half"] += ratio >= 0.5
+                entry["over_limit"] += ratio > 1
+                entry["max_ratio"] = max(entry["max_ratio"], round(ratio, 3))
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "enabled": self._enabled,
+            "store": type(self.store).__name__,
+            "window_seconds": self._window,
+            "limits": dict(self._limits),
+            **counters,
+            "occupancy": occupancy,
+        }
+
+
+auth_limiter = AuthRateLimiter(
+    build_store(AUTH_LIMIT_STORE) if AUTH_LIMIT_ENABLED else MemoryAttemptStore(1),
+    AUTH_LIMIT_WINDOW_SECONDS,
+    AUTH_LIMIT_PER_EMAIL,
+    AUTH_LIMIT_PER_IP,
+    AUTH_LIMIT_ENABLED,
+)
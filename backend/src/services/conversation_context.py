@@ -0,0 +1,141 @@
+import math
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from ..models import ChatSession, Prompt
+
+
+CONTEXT_ENABLED = os.getenv("CONTEXT_ENABLED", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "800"))
+SUMMARY_SNIPPET_CHARS = 240
+CHARS_PER_TOKEN = 4
+# Turns still generating, failed, or answered by the local stub carry no usable answer.
+EXCLUDED_STATUSES = ("processing", "error", "local_fallback")
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+HISTORY_HEADER = "Recent conversation:\n"
+
+
+def estimate_tokens(text: str | None) -> int:
+    # chars/4 approximation; avoids a count_tokens round trip for every turn.
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    context_tokens: int
+    prompt_tokens: int
+    summary_tokens: int
+    history_tokens: int
+    history_turns: int
+
+
+def _render_turn(prompt_text: str, response_text: str) -> str:
+    return f"User: {prompt_text}\nAssistant: {response_text}"
+
+
+def _snippet(text: str) -> str:
+    text = " ".join(text.split())
+    if len(text) <= SUMMARY_SNIPPET_CHARS:
+        return text
+    return text[:SUMMARY_SNIPPET_CHARS].rstrip() + "..."
+
+
+def _fold(summary: str, turns) -> str:
+    """Appends one extractive line per turn; the oldest lines drop off past the cap."""
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        lines.append(f"- User: {_snippet(turn.prompt_text)} | Assistant: {_snippet(turn.response_text)}")
+    max_chars = CONTEXT_SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    folded = "\n".join(lines)
+    return folded if len(folded) <= max_chars else folded[: max_chars - 3] + "..."
+
+
+def assemble_context(
+    db: Session,
+    session: ChatSession,
+    prompt_text: str,
+    before_id: int | None = None,
+) -> AssembledContext:
+    """
+    Builds the model input for a new turn: the session's rolling summary, the
+    most recent turns that fit the token budget, then the prompt itself.
+    Only turns newer than the summary are read; turns that no longer fit are
+    folded into the summary, so each call touches just the unsummarized tail.
+    """
+    prompt_tokens = estimate_tokens(prompt_text)
+    if not CONTEXT_ENABLED:
+        return AssembledContext(prompt_text, prompt_tokens, prompt_tokens, 0, 0, 0)
+
+    summarized_through = session.summarized_through_id or 0
+    query = (
+        # Entities rather than columns: bodies may be stored in text_blobs.
+        select(Prompt)
+        .where(
+            Prompt.session_id == session.id,
+            Prompt.id > summarized_through,
+            Prompt.response_text.is_not(None),
+            Prompt.status.not_in(EXCLUDED_STATUSES),
+        )
+        .order_by(Prompt.id)
+    )
+    if before_id is not None:
+        query = query.where(Prompt.id < before_id)
+    turns = db.scalars(query).all()
+
+    # The summary's full allowance (and the framing) is reserved, so folding can
+    # never push the assembled total over budget.
+    reserved = (
+        estimate_tokens(f"User: {prompt_text}")
+        + CONTEXT_SUMMARY_MAX_TOKENS
+        + estimate_tokens(SUMMARY_HEADER + HISTORY_HEADER + "\n\n" * 3)
+    )
+    history_budget = max(CONTEXT_TOKEN_BUDGET - reserved, 0)
+    recent: list[str] = []
+    history_tokens = 0
+    for turn in reversed(turns):
+        rendered = _render_turn(turn.prompt_text, turn.response_text)
+        cost = estimate_tokens(rendered) + 1
+        if history_tokens + cost > history_budget:
+            break
+        recent.append(rendered)
+        history_tokens += cost
+    recent.reverse()
+
+    summary = session.context_summary or ""
+    overflow = turns[: len(turns) - len(recent)]
+    if overflow:
+        summary = _fold(summary, overflow)
+        # Compare-and-set: a concurrent turn that already advanced the summary wins.
+        db.execute(
+            update(ChatSession)
+            .where(
+                ChatSession.id == session.id,
+                func.coalesce(ChatSession.summarized_through_id, 0) == summarized_through,
+            )
+            .values(context_summary=summary, summarized_through_id=overflow[-1].id)
+            .execution_options(synchronize_session=False)
+        )
+
+    parts = []
+    if summary:
+        parts.append(SUMMARY_HEADER + summary)
+    if recent:
+        parts.append(HISTORY_HEADER + "\n\n".join(recent))
+    # A first turn is sent as-is, so it still shares cache entries with stateless calls.
+    text = "\n\n".join(parts + [f"User: {prompt_text}"]) if parts else prompt_text
+
+    return AssembledContext(
+        text=text,
+        context_tokens=estimate_tokens(text),
+        prompt_tokens=prompt_tokens,
+        summary_tokens=estimate_tokens(summary),
+        history_tokens=history_tokens,
+        history_turns=len(recent),
+    )
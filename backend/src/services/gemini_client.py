@@ -0,0 +1,168 @@
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+
+GEMINI_HTTP_TIMEOUT_MS = int(os.getenv("GEMINI_HTTP_TIMEOUT_MS", "60000"))
+GEMINI_POOL_MAX_CONNECTIONS = int(os.getenv("GEMINI_POOL_MAX_CONNECTIONS", "20"))
+GEMINI_POOL_MAX_KEEPALIVE = int(os.getenv("GEMINI_POOL_MAX_KEEPALIVE", "10"))
+GEMINI_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+# Points the SDK at another endpoint, e.g. a local stand-in server for benchmarks.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "").strip()
+
+_lock = threading.Lock()
+_client = None
+_client_api_key = ""
+# Set while a thread reads a streamed call, so the response hook can hand it the response.
+_stream_owner = threading.local()
+
+
+class StreamAbort:
+    """
+    Lets another thread abort a streamed call mid-read. The response is
+    captured by a transport hook as soon as its headers arrive; abort() shuts
+    down that one socket, so the blocked read fails at once and other calls on
+    the pooled client are untouched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._response = None
+        self._aborted = False
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted
+
+    def attach(self, response) -> None:
+        with self._lock:
+            self._response = response
+            aborted = self._aborted
+        if aborted:
+            _shutdown_response(response)
+
+    def detach(self) -> None:
+        with self._lock:
+            response, self._response = self._response, None
+        if response is not None:
+            # Releases the connection when the reader stopped early; a no-op once fully read.
+            response.close()
+
+    def abort(self) -> None:
+        with self._lock:
+            self._aborted = True
+            response = self._response
+        if response is not None:
+            _shutdown_response(response)
+
+
+def _shutdown_response(response) -> None:
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _capture_response(response) -> None:
+    owner = getattr(_stream_owner, "abort", None)
+    if owner is not None:
+        owner.attach(response)
+
+
+@contextmanager
+def abortable_stream(abort: StreamAbort | None = None):
+    """
+    Routes the response this thread opens inside the block to abort, and closes
+    it on the way out, so a stream left early hands its connection back.
+    """
+    owner = abort or StreamAbort()
+    _stream_owner.abort = owner
+    try:
+        yield owner
+    finally:
+        _stream_owner.abort = None
+        owner.detach()
+
+
+def build_client(api_key: str):
+    """New SDK client whose sync and async transports share the pool settings above."""
+    import httpx
+    from google import genai
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=GEMINI_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=GEMINI_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    http_options = types.HttpOptions(
+        base_url=GEMINI_BASE_URL or None,
+        timeout=GEMINI_HTTP_TIMEOUT_MS,
+        client_args={"limits": limits, "event_hooks": {"response": [_capture_response]}},
+        async_client_args={"limits": limits},
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def close_sync_transport(client) -> None:
+    # The SDK has no public close(); its httpx clients own the pooled connections.
+    try:
+        client._api_client._httpx_client.close()
+    except Exception:
+        pass
+
+
+def get_client():
+    """
+    Shared long-lived client, or None when no API key is configured.
+    Rebuilt only if GEMINI_API_KEY changes.
+    """
+    global _client, _client_api_key
+
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        return None
+
+    with _lock:
+        if _client is None or _client_api_key != api_key:
+            previous = _client
+            _client = build_client(api_key)
+            _client_api_key = api_key
+            if previous is not None:
+                close_sync_transport(previous)
+        return _client
+
+
+def get_async_client():
+    """Async facade (client.aio) of the shared client; same pool limits and timeouts."""
+    client = get_client()
+    return client.aio if client is not None else None
+
+
+def init_client() -> None:
+    try:
+        get_client()
+    except Exception:
+        # Startup must not fail on provider misconfiguration; calls fall back locally.
+        pass
+
+
+async def close_client() -> None:
+    global _client, _client_api_key
+
+    with _lock:
+        client = _client
+        _client = None
+        _client_api_key = ""
+    if client is None:
+        return
+    close_sync_transport(client)
+    try:
+        await client._api_client._async_httpx_client.aclose()
+    except Exception:
+        pass
@@ -1,4 +1,26 @@
+import asyncio
 import os
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FuturesTimeout, wait as futures_wait
+from dataclasses import dataclass
+
+from .gemini_client import StreamAbort, abortable_stream, get_async_client, get_client
+from .hedging import HEDGE_ENABLED, hedge_budget, hedge_delay_seconds, hedge_pool
+from .model_registry import model_registry
+from .provider_limits import PROVIDER_QUEUE_TIMEOUT_SECONDS, ProviderBusy, provider_limiter, user_key
+from .response_cache import RESPONSE_CACHE_ENABLED, cache_key, response_cache
+from .singleflight import FlightAbandoned, SingleFlight
+from .usage_stats import usage_stats
+
+
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "120"))
+
+generation_flights = SingleFlight()
+
+LOCAL_STREAM_DELAY_MS = int(os.getenv("LOCAL_STREAM_DELAY_MS", "0"))
 
 
 def _local_stub_response(prompt: str) -> str:
@@ -9,84 +31,497 @@ def _local_stub_response(prompt: str) -> str:
     return f"[Local fallback] I received your prompt: {text}"
 
 
-def _clean_model_name(name: str) -> str:
-    # SDK list_models may return "models/<name>"; generate_content expects "<name>".
-    return name.split("/", 1)[1] if name.startswith("models/") else name
+def _local_stub_stream(prompt: str) -> Iterator[str]:
+    # Emit the fallback a few words at a time so streaming clients behave the same offline.
+    pieces = re.findall(r"\S+\s*", _local_stub_response(prompt))
+    for index in range(0, len(pieces), 3):
+        if LOCAL_STREAM_DELAY_MS and index:
+            time.sleep(LOCAL_STREAM_DELAY_MS / 1000)
+        yield "".join(pieces[index:index + 3])
+
 
+def _extract_response_text(response) -> str | None:
+    text = getattr(response, "text", None)
+    if isinstance(text, str) and text.strip():
+        return text.strip()
 
-def _resolve_model_candidates(client) -> list[str]:
-    configured = os.getenv("GEMINI_MODEL", "").strip()
-    if configured:
-        return [configured]
+    candidates = getattr(response, "candidates", None) or []
+    for candidate in candidates:
+        content = getattr(candidate, "content", None)
+        parts = getattr(content, "parts", None) or []
+        collected = []
+        for part in parts:
+            part_text = getattr(part, "text", None)
+            if isinstance(part_text, str) and part_text.strip():
+                collected.append(part_text.strip())
+        if collected:
+            return "\n".join(collected).strip()
+    return None
 
-    preferred = [
-        "gemini-3-flash-preview",
-        "gemini-2.0-flash",
-        "gemini-2.0-flash-lite",
-        "gemini-3-flash",
-        "gemini-1.5-flash",
-    ]
+
+def warm_model_registry() -> None:
+    """Starts the first models.list() at startup, off the event loop."""
     try:
-        available = []
-        for model in client.models.list():
-            name = _clean_model_name(getattr(model, "name", "") or "")
-            methods = getattr(model, "supported_generation_methods", None) or []
-            if name and "generateContent" in methods:
-                available.append(name)
-        if not available:
-            return preferred
-
-        ordered = [name for name in preferred if name in available]
-        tail = [name for name in available if name not in ordered]
-        return ordered + tail
+        client = get_client()
     except Exception:
-        return preferred
+        return
+    if client is not None:
+        model_registry.warm(client)
 
 
-def generate_test_response(prompt: str) -> tuple[str, str]:
+async def _awarm_model_registry() -> None:
+    # A cold registry would otherwise list models synchronously on the event loop.
+    try:
+        client = get_client()
+        if client is not None:
+            await model_registry.acandidates(client)
+    except Exception:
+        pass
+
+
+def _request_key(cleaned_prompt: str) -> tuple[str, str] | None:
     """
-    Returns (response_text, status).
+    (key, model_name) for the model expected to answer, or None when no
+    provider is configured. Results are stored under the model that did answer.
+    """
+    try:
+        client = get_client()
+        if client is None:
+            return None
+        model_name = model_registry.expected_model(client)
+    except Exception:
+        return None
+    return cache_key(cleaned_prompt, model_name), model_name
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    status: str
+    model_name: str | None = None
+    queue_wait_ms: int = 0
+
+
+def _fallback(fallback_prompt: str, queue_wait_ms: int = 0) -> GenerationResult:
+    return GenerationResult(_local_stub_response(fallback_prompt), "local_fallback", queue_wait_ms=queue_wait_ms)
+
+
+def generate_response(
+    prompt: str,
+    user_id: int | None = None,
+    fallback_prompt: str | None = None,
+) -> GenerationResult:
+    """
+    Cache, coalescing and provider limits in front of the model call.
+    fallback_prompt is what the local fallback echoes when prompt carries
+    assembled session context; it defaults to prompt.
     status:
       - completed
+      - cached
       - local_fallback
     """
     cleaned_prompt = (prompt or "").strip()
     if not cleaned_prompt:
-        return "Prompt is empty.", "local_fallback"
+        return GenerationResult("Prompt is empty.", "local_fallback")
+    fallback_prompt = (fallback_prompt or "").strip() or cleaned_prompt
+
+    request_key = _request_key(cleaned_prompt)
+    if request_key is None:
+        return _fallback(fallback_prompt)
+    key, model_name = request_key
 
-    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if RESPONSE_CACHE_ENABLED:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return GenerationResult(cached, "cached", model_name=model_name)
 
-    if not api_key:
-        return _local_stub_response(cleaned_prompt), "local_fallback"
+    def generate_and_store() -> GenerationResult:
+        result = _generate_uncached(cleaned_prompt, user_id, fallback_prompt)
+        if RESPONSE_CACHE_ENABLED and result.status == "completed":
+            response_cache.put(cache_key(cleaned_prompt, result.model_name), result.model_name, result.text)
+        return result
 
+    # Identical prompts arriving while this one is in flight share its upstream call.
     try:
-        from google import genai
+        result, _ = generation_flights.do(key, generate_and_store, timeout=SINGLEFLIGHT_WAIT_SECONDS)
+    except (FlightAbandoned, TimeoutError):
+        # The shared call was abandoned or is stuck; this caller makes its own.
+        result = generate_and_store()
+    return result
 
-        client = genai.Client(api_key=api_key)
-        for model_name in _resolve_model_candidates(client):
+
+def generate_test_response(prompt: str) -> tuple[str, str]:
+    """Returns (response_text, status); see generate_response."""
+    result = generate_response(prompt)
+    return result.text, result.status
+
+
+def _attempt_model(
+    client,
+    model_name: str,
+    cleaned_prompt: str,
+    user_id: int | None,
+    admitted: threading.Event | None = None,
+) -> tuple[str | None, float]:
+    """
+    One gated call to one model, recorded on its breaker. Returns (text or None, seconds queued).
+    admitted is set once the call holds its provider slot.
+    """
+    breaker = model_registry.breaker(model_name)
+    try:
+        with provider_limiter.slot(model_name, user_id) as waited:
+            if admitted is not None:
+                admitted.set()
+            started = time.monotonic()
             try:
                 response = client.models.generate_content(
                     model=model_name,
                     contents=cleaned_prompt,
                 )
+            except Exception as exc:
+                breaker.record_failure(time.monotonic() - started, f"{type(exc).__name__}: {exc}")
+                return None, waited
+    except ProviderBusy as exc:
+        return None, exc.waited
+    text = _extract_response_text(response)
+    if text:
+        latency = time.monotonic() - started
+        breaker.record_success(latency)
+        usage_stats.record_latency(model_name, latency)
+        return text, waited
+    breaker.record_failure(time.monotonic() - started, "Empty response")
+    return None, waited
+
+
+def _attempt_hedged(
+    client,
+    model_name: str,
+    next_model: Callable[[], str | None],
+    cleaned_prompt: str,
+    user_id: int | None,
+) -> tuple[str | None, float, str]:
+    """
+    Runs the primary call and, if it is still pending the model's p95 after
+    it got its provider slot, races a call to the next candidate. Time queued
+    for the slot is not counted, so a busy limiter does not trigger hedges.
+    Returns (text or None, seconds queued, model).
+    A losing call cannot be interrupted mid-request in the sync SDK; its result is dropped.
+    """
+    hedge_budget.record_primary()
+    admitted = threading.Event()
+    primary = hedge_pool.submit(_attempt_model, client, model_name, cleaned_prompt, user_id, admitted)
+    # Also wakes up when the primary gives up without ever getting a slot.
+    primary.add_done_callback(lambda _: admitted.set())
+    admitted.wait()
+    try:
+        text, waited = primary.result(timeout=hedge_delay_seconds(model_registry.breaker(model_name)))
+        return text, waited, model_name
+    except FuturesTimeout:
+        pass
+
+    backup_model = next_model() if hedge_budget.try_spend() else None
+    if backup_model is None:
+        text, waited = primary.result()
+        return text, waited, model_name
+
+    backup = hedge_pool.submit(_attempt_model, client, backup_model, cleaned_prompt, user_id)
+    racing = {primary: model_name, backup: backup_model}
+    total_wait = 0.0
+    while racing:
+        done, _ = futures_wait(racing, return_when=FIRST_COMPLETED)
+        for future in done:
+            finished_model = racing.pop(future)
+            text, waited = future.result()
+            total_wait += waited
+            if text:
+                for loser in racing:
+                    loser.cancel()
+                hedge_budget.record_win(finished_model == backup_model)
+                return text, total_wait, finished_model
+    return None, total_wait, model_name
+
+
+def _generate_uncached(cleaned_prompt: str, user_id: int | None, fallback_prompt: str) -> GenerationResult:
+    queue_wait = 0.0
+    try:
+        client = get_client()
+        if client is None:
+            return _fallback(fallback_prompt)
+
+        remaining = iter(model_registry.candidates(client))
+
+        def next_model() -> str | None:
+            # Breakers are consulted lazily: allow_request() may claim a half-open probe.
+            for candidate in remaining:
+                if model_registry.breaker(candidate).allow_request():
+                    return candidate
+            return None
+
+        model_name = next_model()
+        while model_name is not None:
+            if HEDGE_ENABLED:
+                text, waited, model_name = _attempt_hedged(client, model_name, next_model, cleaned_prompt, user_id)
+            else:
+                text, waited = _attempt_model(client, model_name, cleaned_prompt, user_id)
+            queue_wait += waited
+            if text:
+                return GenerationResult(text, "completed", model_name, int(queue_wait * 1000))
+            model_name = next_model()
+        return _fallback(fallback_prompt, int(queue_wait * 1000))
+    except Exception:
+        return _fallback(fallback_prompt, int(queue_wait * 1000))
+
+
+async def agenerate_response(
+    prompt: str,
+    user_id: int | None = None,
+    fallback_prompt: str | None = None,
+) -> GenerationResult:
+    """Async twin of generate_response on the shared client's async transport."""
+    cleaned_prompt = (prompt or "").strip()
+    if not cleaned_prompt:
+        return GenerationResult("Prompt is empty.", "local_fallback")
+    fallback_prompt = (fallback_prompt or "").strip() or cleaned_prompt
+
+    await _awarm_model_registry()
+    request_key = _request_key(cleaned_prompt)
+    if request_key is None:
+        return _fallback(fallback_prompt)
+    key, model_name = request_key
+
+    if RESPONSE_CACHE_ENABLED:
+        cached = await asyncio.to_thread(response_cache.get, key)
+        if cached is not None:
+            return GenerationResult(cached, "cached", model_name=model_name)
+
+    async def generate_and_store() -> GenerationResult:
+        result = await _agenerate_uncached(cleaned_prompt, user_id, fallback_prompt)
+        if RESPONSE_CACHE_ENABLED and result.status == "completed":
+            await asyncio.to_thread(
+                response_cache.put, cache_key(cleaned_prompt, result.model_name), result.model_name, result.text
+            )
+        return result
+
+    try:
+        result, _ = await generation_flights.ado(key, generate_and_store)
+    except FlightAbandoned:
+        result = await generate_and_store()
+    return result
+
+
+async def agenerate_test_response(prompt: str) -> tuple[str, str]:
+    result = await agenerate_response(prompt)
+    return result.text, result.status
+
+
+async def _aattempt_model(
+    async_client,
+    model_name: str,
+    cleaned_prompt: str,
+    user_id: int | None,
+    admitted: asyncio.Event | None = None,
+) -> tuple[str | None, float]:
+    breaker = model_registry.breaker(model_name)
+    gate = provider_limiter.gate(model_name)
+    # The gate blocks on a condition variable, so wait for it off the event loop.
+    acquiring = asyncio.ensure_future(
+        asyncio.to_thread(gate.acquire, user_key(user_id), PROVIDER_QUEUE_TIMEOUT_SECONDS)
+    )
+    try:
+        waited = await asyncio.shield(acquiring)
+    except ProviderBusy as exc:
+        return None, exc.waited
+    except asyncio.CancelledError:
+        # The thread still finishes acquiring; hand the slot straight back when it does.
+        acquiring.add_done_callback(
+            lambda future: gate.release() if not future.cancelled() and future.exception() is None else None
+        )
+        raise
+
+    if admitted is not None:
+        admitted.set()
+    started = time.monotonic()
+    try:
+        response = await async_client.models.generate_content(
+            model=model_name,
+            contents=cleaned_prompt,
+        )
+    except Exception as exc:
+        breaker.record_failure(time.monotonic() - started, f"{type(exc).__name__}: {exc}")
+        return None, waited
+    finally:
+        gate.release()
+    text = _extract_response_text(response)
+    if text:
+        latency = time.monotonic() - started
+        breaker.record_success(latency)
+        usage_stats.record_latency(model_name, latency)
+        return text, waited
+    breaker.record_failure(time.monotonic() - started, "Empty response")
+    return None, waited
+
+
+async def _aattempt_hedged(
+    async_client,
+    model_name: str,
+    next_model: Callable[[], str | None],
+    cleaned_prompt: str,
+    user_id: int | None,
+) -> tuple[str | None, float, str]:
+    """
+    Async hedging; the hedge deadline also starts once the primary holds its
+    slot, and unlike the sync path, the losing request is really cancelled.
+    """
+    hedge_budget.record_primary()
+    admitted = asyncio.Event()
+    primary = asyncio.create_task(_aattempt_model(async_client, model_name, cleaned_prompt, user_id, admitted))
+    admission = asyncio.create_task(admitted.wait())
+    try:
+        await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        admission.cancel()
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay_seconds(model_registry.breaker(model_name)))
+    if done:
+        text, waited = primary.result()
+        return text, waited, model_name
+
+    backup_model = next_model() if hedge_budget.try_spend() else None
+    if backup_model is None:
+        text, waited = await primary
+        return text, waited, model_name
+
+    backup = asyncio.create_task(_aattempt_model(async_client, backup_model, cleaned_prompt, user_id))
+    racing = {primary: model_name, backup: backup_model}
+    total_wait = 0.0
+    try:
+        while racing:
+            done, _ = await asyncio.wait(racing, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                finished_model = racing.pop(task)
+                text, waited = task.result()
+                total_wait += waited
+                if text:
+                    hedge_budget.record_win(finished_model == backup_model)
+                    return text, total_wait, finished_model
+        return None, total_wait, model_name
+    finally:
+        for loser in racing:
+            loser.cancel()
+
+
+async def _agenerate_uncached(cleaned_prompt: str, user_id: int | None, fallback_prompt: str) -> GenerationResult:
+    queue_wait = 0.0
+    try:
+        async_client = get_async_client()
+        if async_client is None:
+            return _fallback(fallback_prompt)
+
+        remaining = iter(await model_registry.acandidates(get_client()))
+
+        def next_model() -> str | None:
+            for candidate in remaining:
+                if model_registry.breaker(candidate).allow_request():
+                    return candidate
+            return None
+
+        model_name = next_model()
+        while model_name is not None:
+            if HEDGE_ENABLED:
+                text, waited, model_name = await _aattempt_hedged(
+                    async_client, model_name, next_model, cleaned_prompt, user_id
+                )
+            else:
+                text, waited = await _aattempt_model(async_client, model_name, cleaned_prompt, user_id)
+            queue_wait += waited
+            if text:
+                return GenerationResult(text, "completed", model_name, int(queue_wait * 1000))
+            model_name = next_model()
+        return _fallback(fallback_prompt, int(queue_wait * 1000))
+    except Exception:
+        return _fallback(fallback_prompt, int(queue_wait * 1000))
+
+
+def stream_test_response(
+    prompt: str,
+    user_id: int | None = None,
+    abort: StreamAbort | None = None,
+) -> Iterator[tuple[str, str]]:
+    """
+    Yields (text_chunk, status) as the model produces output.
+    status is the same vocabulary as generate_test_response; the status of the
+    last chunk is the status of the whole response. If the upstream fails after
+    text went out, a final ("", "error") marks the response as cut short.
+    Closing the generator, or abort.abort() from another thread, aborts the
+    upstream request.
+    """
+    cleaned_prompt = (prompt or "").strip()
+    if not cleaned_prompt:
+        yield "Prompt is empty.", "local_fallback"
+        return
 
-                text = getattr(response, "text", None)
-                if isinstance(text, str) and text.strip():
-                    return text.strip(), "completed"
-
-                candidates = getattr(response, "candidates", None) or []
-                for candidate in candidates:
-                    content = getattr(candidate, "content", None)
-                    parts = getattr(content, "parts", None) or []
-                    collected = []
-                    for part in parts:
-                        part_text = getattr(part, "text", None)
-                        if isinstance(part_text, str) and part_text.strip():
-                            collected.append(part_text.strip())
-                    if collected:
-                        return "\n".join(collected).strip(), "completed"
-            except Exception:
+    if not os.getenv("GEMINI_API_KEY", "").strip():
+        for chunk in _local_stub_stream(cleaned_prompt):
+            yield chunk, "local_fallback"
+        return
+
+    lookup = _request_key(cleaned_prompt) if RESPONSE_CACHE_ENABLED else None
+    if lookup is not None:
+        cached = response_cache.get(lookup[0])
+        if cached is not None:
+            yield cached, "cached"
+            return
+
+    try:
+        # The shared client: abort and early close act on this stream's connection only.
+        client = get_client()
+        for model_name in model_registry.candidates(client):
+            if abort is not None and abort.aborted:
+                return
+            breaker = model_registry.breaker(model_name)
+            if not breaker.allow_request():
                 continue
-        return _local_stub_response(cleaned_prompt), "local_fallback"
+            gate = provider_limiter.gate(model_name)
+            try:
+                gate.acquire(user_key(user_id), PROVIDER_QUEUE_TIMEOUT_SECONDS)
+            except ProviderBusy:
+                continue
+            started = time.monotonic()
+            emitted = False
+            collected = []
+            try:
+                with abortable_stream(abort):
+                    for chunk in client.models.generate_content_stream(
+                        model=model_name,
+                        contents=cleaned_prompt,
+                    ):
+                        text = getattr(chunk, "text", None)
+                        if isinstance(text, str) and text:
+                            emitted = True
+                            collected.append(text)
+                            yield text, "completed"
+            except Exception as exc:
+                if abort is not None and abort.aborted:
+                    # The consumer hung up; not the model's fault.
+                    return
+                breaker.record_failure(time.monotonic() - started, f"{type(exc).__name__}: {exc}")
+                if emitted:
+                    # Text already went out, so neither another model nor the fallback can take over.
+                    yield "", "error"
+                    return
+                continue
+            finally:
+                # Also runs when the consumer closes the generator mid-stream.
+                gate.release()
+            if emitted:
+                latency = time.monotonic() - started
+                breaker.record_success(latency)
+                usage_stats.record_latency(model_name, latency)
+                if lookup is not None:
+                    response_cache.put(cache_key(cleaned_prompt, model_name), model_name, "".join(collected).strip())
+                return
+            breaker.record_failure(time.monotonic() - started, "Empty response")
     except Exception:
-        return _local_stub_response(cleaned_prompt), "local_fallback"
+        pass
+
+    for chunk in _local_stub_stream(cleaned_prompt):
+        yield chunk, "local_fallback"
@@ -0,0 +1,69 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "5000"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "200"))
+# Hedges allowed per primary call; clamped to 1.0 so spend can at most double.
+HEDGE_BUDGET_RATIO = min(max(float(os.getenv("HEDGE_BUDGET_RATIO", "0.1")), 0.0), 1.0)
+HEDGE_POOL_SIZE = int(os.getenv("HEDGE_POOL_SIZE", "16"))
+
+
+class HedgeBudget:
+    """
+    Caps hedges at `ratio` times the number of primary calls seen so far.
+    With ratio <= 1 the number of upstream requests is at most twice the
+    number that would have been sent without hedging.
+    """
+
+    def __init__(self, ratio: float):
+        self._ratio = ratio
+        self._lock = threading.Lock()
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def record_primary(self) -> None:
+        with self._lock:
+            self.primaries += 1
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self._ratio * self.primaries:
+                self.denied += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def record_win(self, hedge_won: bool) -> None:
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": HEDGE_ENABLED,
+                "budget_ratio": self._ratio,
+                "primaries": self.primaries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "denied": self.denied,
+            }
+
+
+def hedge_delay_seconds(breaker) -> float:
+    """Deadline before hedging: the model's observed latency quantile, floored."""
+    observed = breaker.latency_percentile_ms(HEDGE_QUANTILE, HEDGE_MIN_SAMPLES)
+    delay_ms = observed if observed is not None else HEDGE_DEFAULT_DELAY_MS
+    return max(delay_ms, HEDGE_MIN_DELAY_MS) / 1000
+
+
+hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO)
+# Only used in hedging mode; threads are created lazily on first submit.
+hedge_pool = ThreadPoolExecutor(max_workers=max(2, HEDGE_POOL_SIZE), thread_name_prefix="hedge")
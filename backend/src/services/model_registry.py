@@ -0,0 +1,295 @@
+import asyncio
+import os
+import threading
+import time
+
+from .singleflight import SingleFlight
+
+
+MODEL_LIST_TTL_SECONDS = float(os.getenv("MODEL_LIST_TTL_SECONDS", "600"))
+MODEL_LIST_RETRY_SECONDS = float(os.getenv("MODEL_LIST_RETRY_SECONDS", "30"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("MODEL_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("MODEL_BREAKER_COOLDOWN_SECONDS", "30"))
+LATENCY_EWMA_ALPHA = 0.2
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended.
+LATENCY_BUCKETS_MS = [
+    50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000,
+    5000, 7500, 10000, 15000, 20000, 30000, 60000,
+]
+
+PREFERRED_MODELS = [
+    "gemini-3-flash-preview",
+    "gemini-2.0-flash",
+    "gemini-2.0-flash-lite",
+    "gemini-3-flash",
+    "gemini-1.5-flash",
+]
+
+
+def _clean_model_name(name: str) -> str:
+    # SDK list_models may return "models/<name>"; generate_content expects "<name>".
+    return name.split("/", 1)[1] if name.startswith("models/") else name
+
+
+def _list_generation_models(client) -> list[str]:
+    available = []
+    for model in client.models.list():
+        name = _clean_model_name(getattr(model, "name", "") or "")
+        methods = getattr(model, "supported_generation_methods", None) or []
+        if name and "generateContent" in methods:
+            available.append(name)
+    if not available:
+        return list(PREFERRED_MODELS)
+
+    ordered = [name for name in PREFERRED_MODELS if name in available]
+    tail = [name for name in available if name not in ordered]
+    return ordered + tail
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles resolve to a bucket's upper bound."""
+
+    def __init__(self, bounds_ms: list[float]):
+        self._bounds = list(bounds_ms)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self.count = 0
+
+    def bucket_index(self, latency_ms: float) -> int:
+        for position, bound in enumerate(self._bounds):
+            if latency_ms <= bound:
+                return position
+        return len(self._bounds)
+
+    def record(self, latency_ms: float) -> None:
+        self.add(self.bucket_index(latency_ms), 1)
+
+    def add(self, index: int, count: int) -> None:
+        self._counts[index] += count
+        self.count += count
+
+    def percentile(self, quantile: float) -> float | None:
+        if not self.count:
+            return None
+        target = quantile * self.count
+        running = 0
+        for position, bucket_count in enumerate(self._counts):
+            running += bucket_count
+            if running >= target:
+                return self._bounds[position] if position < len(self._bounds) else float(self._bounds[-1] * 2)
+        return float(self._bounds[-1] * 2)
+
+    def snapshot(self) -> dict:
+        labels = [f"le_{bound}" for bound in self._bounds] + ["inf"]
+        return {label: count for label, count in zip(labels, self._counts) if count}
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker: closed -> open after consecutive failures, open ->
+    half_open once the cooldown passes (a single probe is let through), and
+    half_open -> closed on a successful probe or back to open on failure.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self._failure_threshold = max(1, failure_threshold)
+        self._cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.total_successes = 0
+        self.total_failures = 0
+        self.avg_latency_ms: float | None = None
+        self.last_latency_ms: float | None = None
+        self.last_error: str | None = None
+        self._opened_at = 0.0
+        self._probe_started_at: float | None = None
+        # Successful calls only, so hedge deadlines reflect healthy latency.
+        self.latency = LatencyHistogram(LATENCY_BUCKETS_MS)
+
+    def allow_request(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if now - self._opened_at < self._cooldown_seconds:
+                    return False
+                self.state = "half_open"
+                self._probe_started_at = None
+            # half_open: one probe at a time; a probe that never reports back expires.
+            if self._probe_started_at is not None and now - self._probe_started_at < self._cooldown_seconds:
+                return False
+            self._probe_started_at = now
+            return True
+
+    def is_open(self) -> bool:
+        """True while calls are refused outright; unlike allow_request(), never claims a probe."""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self._cooldown_seconds
+
+    def record_success(self, latency_seconds: float) -> None:
+        with self._lock:
+            self._record_latency(latency_seconds)
+            self.latency.record(latency_seconds * 1000)
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            self.state = "closed"
+            self._probe_started_at = None
+
+    def record_failure(self, latency_seconds: float, error: str) -> None:
+        with self._lock:
+            self._record_latency(latency_seconds)
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+            if self.state == "half_open" or self.consecutive_failures >= self._failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+
+    def _record_latency(self, latency_seconds: float) -> None:
+        latency_ms = latency_seconds * 1000
+        self.last_latency_ms = latency_ms
+        if self.avg_latency_ms is None:
+            self.avg_latency_ms = latency_ms
+        else:
+            self.avg_latency_ms += LATENCY_EWMA_ALPHA * (latency_ms - self.avg_latency_ms)
+
+    def latency_percentile_ms(self, quantile: float, min_samples: int = 1) -> float | None:
+        with self._lock:
+            if self.latency.count < min_samples:
+                return None
+            return self.latency.percentile(quantile)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = max(self._cooldown_seconds - (time.monotonic() - self._opened_at), 0.0)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_successes": self.total_successes,
+                "total_failures": self.total_failures,
+                "avg_latency_ms": round(self.avg_latency_ms, 1) if self.avg_latency_ms is not None else None,
+                "last_latency_ms": round(self.last_latency_ms, 1) if self.last_latency_ms is not None else None,
+                "last_error": self.last_error,
+                "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+                "p50_ms": self.latency.percentile(0.5),
+                "p95_ms": self.latency.percentile(0.95),
+                "p99_ms": self.latency.percentile(0.99),
+                "latency_histogram": self.latency.snapshot(),
+            }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of generation-capable models plus a breaker per model.
+    The list is fetched once, then served stale while a background thread
+    refreshes it after the TTL, so prompts never wait on models.list().
+    The first fetch is shared by every caller that needs it, and warm()
+    starts it at startup so it is usually done before the first prompt.
+    """
+
+    def __init__(self, ttl_seconds: float, retry_seconds: float):
+        self._ttl_seconds = ttl_seconds
+        self._retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._models: list[str] | None = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._cold_fetches = SingleFlight()
+
+    def candidates(self, client) -> list[str]:
+        configured = os.getenv("GEMINI_MODEL", "").strip()
+        if configured:
+            return [configured]
+
+        with self._lock:
+            models = self._models
+            stale = time.monotonic() >= self._expires_at
+            start_background = models is not None and stale and not self._refreshing
+            if start_background:
+                self._refreshing = True
+
+        if models is None:
+            return self._cold_refresh(client)
+        if start_background:
+            threading.Thread(
+                target=self.refresh,
+                args=(client,),
+                name="model-registry-refresh",
+                daemon=True,
+            ).start()
+        return models
+
+    async def acandidates(self, client) -> list[str]:
+        """candidates() for the event loop: a cold list is fetched on a worker thread."""
+        with self._lock:
+            cold = self._models is None
+        if not cold or os.getenv("GEMINI_MODEL", "").strip():
+            return self.candidates(client)
+        models, _ = await self._cold_fetches.ado("models", lambda: asyncio.to_thread(self.refresh, client))
+        return models
+
+    def warm(self, client) -> None:
+        """Starts the first fetch on a background thread; callers arriving meanwhile join it."""
+        with self._lock:
+            cold = self._models is None
+        if not cold or os.getenv("GEMINI_MODEL", "").strip():
+            return
+        threading.Thread(
+            target=self._cold_refresh,
+            args=(client,),
+            name="model-registry-warm",
+            daemon=True,
+        ).start()
+
+    def _cold_refresh(self, client) -> list[str]:
+        models, _ = self._cold_fetches.do("models", lambda: self.refresh(client))
+        return models
+
+    def expected_model(self, client) -> str:
+        """The model a call would try first: the first candidate whose breaker is not open."""
+        candidates = self.candidates(client)
+        for model_name in candidates:
+            if not self.breaker(model_name).is_open():
+                return model_name
+        return candidates[0]
+
+    def refresh(self, client) -> list[str]:
+        try:
+            models = _list_generation_models(client)
+            ttl = self._ttl_seconds
+        except Exception:
+            models = self._models or list(PREFERRED_MODELS)
+            ttl = self._retry_seconds
+        with self._lock:
+            self._models = models
+            self._expires_at = time.monotonic() + ttl
+            self._refreshing = False
+        return models
+
+    def breaker(self, model_name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model_name)
+            if breaker is None:
+                breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+                self._breakers[model_name] = breaker
+            return breaker
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = list(self._models) if self._models is not None else None
+            expires_in = max(self._expires_at - time.monotonic(), 0.0) if models is not None else None
+            breakers = dict(self._breakers)
+        return {
+            "configured_model": os.getenv("GEMINI_MODEL", "").strip() or None,
+            "models": models,
+            "expires_in_seconds": round(expires_in, 1) if expires_in is not None else None,
+            "breakers": {name: breaker.snapshot() for name, breaker in breakers.items()},
+        }
+
+
+model_registry = ModelRegistry(MODEL_LIST_TTL_SECONDS, MODEL_LIST_RETRY_SECONDS)
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi.concurrency import run_in_threadpool
+
+
+# Kept free of app imports: spawned pool workers import this module on start.
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "150000"))
+# 0 hashes on the request threadpool instead of a process pool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Hashes running or waiting for a worker; beyond this, callers get PasswordHasherBusy.
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+HASH_SCHEME = "pbkdf2_sha256"
+# Hashes written before the scheme prefix existed are "salt$digest" at this count.
+LEGACY_ITERATIONS = 150_000
+
+
+def _b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("utf-8").rstrip("=")
+
+
+def _b64url_decode(data: str) -> bytes:
+    padding = "=" * (-len(data) % 4)
+    return base64.urlsafe_b64decode(data + padding)
+
+
+def hash_password(password: str, salt: bytes | None = None, iterations: int = PASSWORD_HASH_ITERATIONS) -> str:
+    salt_bytes = salt or secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt_bytes, iterations)
+    return f"{HASH_SCHEME}${iterations}${_b64url_encode(salt_bytes)}${_b64url_encode(digest)}"
+
+
+def _parse_hash(stored_hash: str) -> tuple[int, bytes, bytes]:
+    parts = stored_hash.split("$")
+    if len(parts) == 2:
+        iterations, salt_b64, digest_b64 = LEGACY_ITERATIONS, *parts
+    elif len(parts) == 4 and parts[0] == HASH_SCHEME:
+        iterations, salt_b64, digest_b64 = int(parts[1]), parts[2], parts[3]
+    else:
+        raise ValueError("Unrecognized password hash")
+    return iterations, _b64url_decode(salt_b64), _b64url_decode(digest_b64)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    try:
+        iterations, _, _ = _parse_hash(stored_hash)
+    except ValueError:
+        return False
+    return not stored_hash.startswith(f"{HASH_SCHEME}$") or iterations != PASSWORD_HASH_ITERATIONS
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    try:
+        iterations, salt, expected_digest = _parse_hash(stored_hash)
+    except ValueError:
+        return False
+
+    actual_digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return hmac.compare_digest(actual_digest, expected_digest)
+
+
+def verify_and_rehash(password: str, stored_hash: str) -> tuple[bool, str | None]:
+    """Verifies, and on success returns a new hash when the stored one uses old parameters."""
+    if not verify_password(password, stored_hash):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored_hash) else None
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when PASSWORD_HASH_QUEUE_LIMIT hashes are already running or queued."""
+
+
+class PasswordHasher:
+    """
+    Runs PBKDF2 in a small process pool so a login burst cannot occupy the
+    request threadpool or the GIL. Admission is capped, and callers past the
+    cap fail fast instead of queueing behind the burst. The pool starts on
+    first use; its workers are spawned, so scripts that embed the app need an
+    `if __name__ == "__main__"` guard (or PASSWORD_HASH_WORKERS=0).
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self._workers = workers
+        self._queue_limit = max(1, queue_limit)
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, stored_hash: str) -> tuple[bool, str | None]:
+        return await self._run(verify_and_rehash, password, stored_hash)
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self._queue_limit:
+                self._rejected += 1
+                raise PasswordHasherBusy()
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        # The slot is released when the hash itself ends, not when the caller
+        # stops waiting: a cancelled request leaves its hash running.
+        if self._workers <= 0:
+            return await run_in_threadpool(self._tracked, fn, *args)
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _tracked(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawn, not fork: the server process has live threads and event loops.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self._workers,
+                "mode": "process" if self._workers > 0 else "thread",
+                "iterations": PASSWORD_HASH_ITERATIONS,
+                "queue_limit": self._queue_limit,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "started": self._executor is not None,
+            }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
@@ -0,0 +1,127 @@
+import os
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from ..database import SessionLocal
+from ..models import Prompt
+from ..schemas import PromptBatchItem, PromptResponse
+from .gemini_test_service import generate_response
+from .usage_stats import usage_stats
+
+
+PROMPT_BATCH_PARALLELISM = int(os.getenv("PROMPT_BATCH_PARALLELISM", "4"))
+PROMPT_BATCH_MAX_PARALLELISM = int(os.getenv("PROMPT_BATCH_MAX_PARALLELISM", "16"))
+
+
+def batch_parallelism(requested: int | None) -> int:
+    return max(1, min(requested or PROMPT_BATCH_PARALLELISM, PROMPT_BATCH_MAX_PARALLELISM))
+
+
+def _run_item(index: int, row: PromptResponse) -> PromptBatchItem:
+    # Each item commits on its own, so a failure here never undoes finished items.
+    started_at = datetime.utcnow()
+    values = {"started_at": started_at}
+    error = None
+    try:
+        result = generate_response(row.prompt_text, user_id=row.user_id)
+        values.update(
+            response_text=result.text,
+            status=result.status,
+            queue_wait_ms=result.queue_wait_ms,
+        )
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+        values.update(response_text=f"Generation failed: {type(exc).__name__}", status="error")
+    values["completed_at"] = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        # Through the ORM so the text storage flush hook sees the response.
+        prompt = db.get(Prompt, row.id)
+        for name, value in values.items():
+            setattr(prompt, name, value)
+        db.commit()
+        usage_stats.record_prompt_finished(row.created_at, values["status"])
+    except Exception as exc:
+        db.rollback()
+        error = error or f"{type(exc).__name__}: {exc}"
+        values["status"] = "error"
+    finally:
+        db.close()
+
+    return PromptBatchItem(
+        index=index,
+        prompt=row.model_copy(
+            update={
+                "response_text": values["response_text"],
+                "status": values["status"],
+                "queue_wait_ms": values.get("queue_wait_ms"),
+            }
+        ),
+        error=error,
+    )
+
+
+def _interrupt(rows: list[PromptResponse]) -> None:
+    """Closes out rows whose items were dropped before they started."""
+    if not rows:
+        return
+    db = SessionLocal()
+    try:
+        # Only rows still processing are closed out and counted; a row deleted or
+        # finished meanwhile is left alone. MySQL has no UPDATE ... RETURNING.
+        interrupted = set(
+            db.scalars(
+                select(Prompt.id)
+                .where(Prompt.id.in_([row.id for row in rows]), Prompt.status == "processing")
+                .with_for_update()
+            )
+        )
+        if interrupted:
+            db.execute(
+                update(Prompt)
+                .where(Prompt.id.in_(interrupted))
+                .values(status="interrupted", completed_at=datetime.utcnow())
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        return
+    finally:
+        db.close()
+    for row in rows:
+        if row.id in interrupted:
+            usage_stats.record_prompt_finished(row.created_at, "interrupted")
+
+
+class PromptBatchRun:
+    """
+    Generates responses for already-inserted rows, yielding items as they
+    finish. Every item is submitted on construction, so the rows finish even
+    if nobody ever iterates; close() (the NDJSON client went away) drops the
+    items not yet started and marks their rows interrupted, running items finish.
+    """
+
+    def __init__(self, rows: list[PromptResponse], parallelism: int):
+        self._pool = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="prompt-batch")
+        self._futures = {self._pool.submit(_run_item, index, row): row for index, row in enumerate(rows)}
+        # Queued items still run; this only lets the workers exit once they are done.
+        self._pool.shutdown(wait=False)
+        self._done = as_completed(self._futures)
+
+    def __iter__(self) -> Iterator[PromptBatchItem]:
+        return self
+
+    def __next__(self) -> PromptBatchItem:
+        return next(self._done).result()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        _interrupt([row for future, row in self._futures.items() if future.cancelled()])
+
+
+def run_prompt_batch(rows: list[PromptResponse], parallelism: int) -> PromptBatchRun:
+    return PromptBatchRun(rows, parallelism)
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import os
+import zlib
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from ..database import open_request_session, pick_read_replica
+from ..models import Prompt, TextBlob, User
+
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+EXPORT_COLUMNS = [
+    "id",
+    "user_id",
+    "user_email",
+    "session_id",
+    "status",
+    "created_at",
+    "completed_at",
+    "prompt_text",
+    "response_text",
+]
+
+
+@dataclass
+class ExportFilters:
+    since: datetime | None = None
+    until: datetime | None = None
+    user_id: int | None = None
+    status: str | None = None
+
+
+def export_query(filters: ExportFilters):
+    # Plain column rows rather than ORM entities, so nothing accumulates in an identity map.
+    # Blob-stored bodies come along through outer joins and are decoded per row.
+    prompt_blob = aliased(TextBlob)
+    response_blob = aliased(TextBlob)
+    query = (
+        select(
+            Prompt.id,
+            Prompt.user_id,
+            User.email.label("user_email"),
+            Prompt.session_id,
+            Prompt.status,
+            Prompt.created_at,
+            Prompt.completed_at,
+            Prompt.prompt_inline,
+            Prompt.response_inline,
+            prompt_blob.codec.label("prompt_codec"),
+            prompt_blob.data.label("prompt_data"),
+            response_blob.codec.label("response_codec"),
+            response_blob.data.label("response_data"),
+        )
+        .join(User, Prompt.user_id == User.id)
+        .outerjoin(prompt_blob, prompt_blob.digest == Prompt.prompt_blob_digest)
+        .outerjoin(response_blob, response_blob.digest == Prompt.response_blob_digest)
+    )
+    if filters.since is not None:
+        query = query.where(Prompt.created_at >= filters.since)
+    if filters.until is not None:
+        query = query.where(Prompt.created_at < filters.until)
+    if filters.user_id is not None:
+        query = query.where(Prompt.user_id == filters.user_id)
+    if filters.status is not None:
+        query = query.where(Prompt.status == filters.status)
+    return query.order_by(Prompt.created_at, Prompt.id).execution_options(yield_per=EXPORT_BATCH_ROWS)
+
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _row_values(row) -> list:
+    prompt_text = TextBlob.decode(row.prompt_codec, row.prompt_data) if row.prompt_codec else row.prompt_inline
+    response_text = (
+        TextBlob.decode(row.response_codec, row.response_data) if row.response_codec else row.response_inline
+    )
+    return [_format_value(value) for value in row[:7]] + [prompt_text, response_text]
+
+
+def _encode_ndjson(rows) -> bytes:
+    lines = [json.dumps(dict(zip(EXPORT_COLUMNS, _row_values(row)))) for row in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _encode_csv(rows, include_header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([_row_values(row) for row in rows])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_prompt_export(filters: ExportFilters, fmt: str, gzip: bool) -> AsyncIterator[bytes]:
+    """
+    Yields the export one fetch batch at a time from a server-side cursor, so
+    memory stays bounded by EXPORT_BATCH_ROWS whatever the table size.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if gzip else None
+    first = True
+    # Its own session: the stream outlives the request's dependency-scoped one.
+    # Being a long read-only scan, it goes to a replica when one is configured.
+    async with open_request_session(pick_read_replica()) as db:
+        result = await db.stream(export_query(filters))
+        async for rows in result.partitions(EXPORT_BATCH_ROWS):
+            chunk = _encode_ndjson(rows) if fmt == "ndjson" else _encode_csv(rows, include_header=first)
+            first = False
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+
+    if fmt == "csv" and first:
+        chunk = _encode_csv([], include_header=True)
+        yield compressor.compress(chunk) if compressor is not None else chunk
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,229 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from ..database import SessionLocal
+from ..models import ChatSession, Prompt
+from .conversation_context import assemble_context
+from .gemini_test_service import generate_response
+from .usage_stats import usage_stats
+
+
+PROMPT_QUEUE_WORKERS = int(os.getenv("PROMPT_QUEUE_WORKERS", "4"))
+PROMPT_QUEUE_MAX_PENDING = int(os.getenv("PROMPT_QUEUE_MAX_PENDING", "200"))
+UNFINISHED_STATUS = "processing"
+logger = logging.getLogger(__name__)
+
+
+class PromptQueueFull(Exception):
+    """Raised when the pending job queue has no room for another prompt."""
+
+
+class PromptJobQueue:
+    """
+    Bounded in-process worker pool for prompts submitted in async mode.
+    Jobs carry only the prompt id; workers open their own DB session so the
+    request that enqueued the job can return (and release its session) at once.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._worker_count = max(1, workers)
+        self._jobs: queue.Queue[int | None] = queue.Queue(maxsize=max(1, max_pending))
+        self._lock = threading.Lock()
+        # Insertion-ordered, so iteration order is queue order.
+        self._pending: dict[int, float] = {}
+        self._running: dict[int, float] = {}
+        self._threads: list[threading.Thread] = []
+        self._recovered = False
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            recover, self._recovered = not self._recovered, True
+            for index in range(self._worker_count):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"prompt-worker-{index}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        if recover:
+            self._recover_stale()
+
+    def _recover_stale(self) -> None:
+        """
+        Picks up rows a previous process left "processing". Rows no worker had
+        started are queued again; rows cut off mid-generation are marked failed.
+        """
+        cutoff = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            stale = db.scalars(
+                select(Prompt).where(Prompt.status == UNFINISHED_STATUS, Prompt.created_at < cutoff)
+            ).all()
+            requeue = []
+            finished = []
+            for prompt in stale:
+                if prompt.started_at is None and len(requeue) < self._jobs.maxsize:
+                    requeue.append(prompt.id)
+                    continue
+                prompt.response_text = prompt.response_text or "Generation interrupted by a restart"
+                prompt.status = "error"
+                prompt.completed_at = cutoff
+                finished.append(prompt.created_at)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Could not recover stale prompt rows")
+            return
+        finally:
+            db.close()
+        for created_at in finished:
+            usage_stats.record_prompt_finished(created_at, "error")
+        for prompt_id in requeue:
+            try:
+                self._enqueue(prompt_id)
+            except PromptQueueFull:
+                break
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            threads = self._threads
+            self._threads = []
+        for _ in threads:
+            # Sentinels go behind pending jobs so queued work still drains.
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+    def submit(self, prompt_id: int) -> None:
+        self.start()
+        self._enqueue(prompt_id)
+
+    def _enqueue(self, prompt_id: int) -> None:
+        with self._lock:
+            if prompt_id in self._pending:
+                return
+            self._pending[prompt_id] = time.monotonic()
+            try:
+                self._jobs.put_nowait(prompt_id)
+            except queue.Full as exc:
+                self._pending.pop(prompt_id, None)
+                raise PromptQueueFull("Prompt queue is full") from exc
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def job_state(self, prompt_id: int) -> dict | None:
+        """Live queue state for a prompt, or None if this process is not tracking it."""
+        now = time.monotonic()
+        with self._lock:
+            if prompt_id in self._running:
+                return {
+                    "progress": "running",
+                    "queue_position": 0,
+                    "running_ms": int((now - self._running[prompt_id]) * 1000),
+                }
+            if prompt_id in self._pending:
+                position = list(self._pending).index(prompt_id) + 1
+                return {
+                    "progress": "queued",
+                    "queue_position": position,
+                    "running_ms": 0,
+                }
+        return None
+
+    def _worker_loop(self) -> None:
+        while True:
+            prompt_id = self._jobs.get()
+            if prompt_id is None:
+                return
+            with self._lock:
+                self._pending.pop(prompt_id, None)
+                self._running[prompt_id] = time.monotonic()
+            try:
+                _run_prompt_job(prompt_id)
+            finally:
+                with self._lock:
+                    self._running.pop(prompt_id, None)
+
+
+def _claim(db, prompt_id: int) -> bool:
+    # A conditional update, so a row queued twice (submit racing recovery) runs once.
+    claimed = db.execute(
+        update(Prompt)
+        .where(Prompt.id == prompt_id, Prompt.status == UNFINISHED_STATUS, Prompt.started_at.is_(None))
+        .values(started_at=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return bool(claimed)
+
+
+def _run_prompt_job(prompt_id: int) -> None:
+    db = SessionLocal()
+    try:
+        if not _claim(db, prompt_id):
+            return
+        prompt = db.get(Prompt, prompt_id)
+        if prompt is None:
+            return
+        user_id = prompt.user_id
+        raw_prompt = prompt_text = prompt.prompt_text
+        session = db.get(ChatSession, prompt.session_id) if prompt.session_id is not None else None
+        if session is not None:
+            context = assemble_context(db, session, prompt.prompt_text, before_id=prompt.id)
+            prompt_text = context.text
+            prompt.context_tokens = context.context_tokens
+        # Committing returns the connection to the pool for the length of the model call.
+        db.commit()
+
+        try:
+            result = generate_response(prompt_text, user_id=user_id, fallback_prompt=raw_prompt)
+            prompt.response_text = result.text
+            prompt.status = result.status
+            prompt.queue_wait_ms = result.queue_wait_ms
+        except Exception as exc:
+            prompt.response_text = f"Generation failed: {type(exc).__name__}"
+            prompt.status = "error"
+        prompt.completed_at = datetime.utcnow()
+        created_at, final_status = prompt.created_at, prompt.status
+        db.commit()
+        usage_stats.record_prompt_finished(created_at, final_status)
+    except Exception:
+        db.rollback()
+        logger.exception("Prompt job %s failed outside generation", prompt_id)
+        _mark_failed(db, prompt_id)
+    finally:
+        db.close()
+
+
+def _mark_failed(db, prompt_id: int) -> None:
+    # Otherwise the row would sit in "processing" until the next restart.
+    try:
+        prompt = db.get(Prompt, prompt_id)
+        if prompt is None or prompt.status != UNFINISHED_STATUS:
+            return
+        prompt.status = "error"
+        prompt.response_text = prompt.response_text or "Generation failed"
+        prompt.completed_at = datetime.utcnow()
+        created_at = prompt.created_at
+        db.commit()
+        usage_stats.record_prompt_finished(created_at, "error")
+    except Exception:
+        db.rollback()
+        logger.exception("Could not mark prompt %s as failed", prompt_id)
+
+
+prompt_queue = PromptJobQueue(PROMPT_QUEUE_WORKERS, PROMPT_QUEUE_MAX_PENDING)
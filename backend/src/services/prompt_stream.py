@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from ..database import SessionLocal
+from ..models import Prompt
+from .gemini_client import StreamAbort
+from .gemini_test_service import stream_test_response
+from .usage_stats import usage_stats
+
+
+STREAM_FLUSH_INTERVAL_MS = int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "500"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "2000"))
+
+
+class PromptStreamPump:
+    """
+    Drives stream_test_response on a background thread for one prompt row.
+    Chunks are handed to the SSE response through a queue, and the partial
+    text is written to Prompt.response_text at bounded intervals so a client
+    that reconnects can pick up from what is already stored.
+    """
+
+    def __init__(self, prompt_id: int, prompt_text: str, user_id: int | None = None):
+        self.prompt_id = prompt_id
+        self._prompt_text = prompt_text
+        self._user_id = user_id
+        self._events: queue.Queue[tuple[str, str]] = queue.Queue()
+        self._cancelled = threading.Event()
+        self._abort = StreamAbort()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"prompt-stream-{prompt_id}",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def cancel(self) -> None:
+        # The producer checks the event between chunks; the abort breaks a read blocked on the model.
+        self._cancelled.set()
+        self._abort.abort()
+
+    def next_event(self, timeout: float) -> tuple[str, str] | None:
+        """Returns ("chunk", text) or ("done", status), or None on timeout."""
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _run(self) -> None:
+        db = SessionLocal()
+        chunks = stream_test_response(self._prompt_text, self._user_id, self._abort)
+        collected: list[str] = []
+        final_status = "error"
+        unflushed_chars = 0
+        last_flush = time.monotonic()
+        try:
+            prompt = db.get(Prompt, self.prompt_id)
+            if prompt is None:
+                return
+            chunk_status = "local_fallback"
+            for chunk, chunk_status in chunks:
+                if self._cancelled.is_set():
+                    break
+                if not chunk:
+                    continue
+                collected.append(chunk)
+                unflushed_chars += len(chunk)
+                self._events.put(("chunk", chunk))
+
+                now = time.monotonic()
+                if (
+                    unflushed_chars >= STREAM_FLUSH_CHARS
+                    or (now - last_flush) * 1000 >= STREAM_FLUSH_INTERVAL_MS
+                ):
+                    prompt.response_text = "".join(collected)
+                    db.commit()
+                    unflushed_chars = 0
+                    last_flush = now
+            final_status = "interrupted" if self._cancelled.is_set() else chunk_status
+        except Exception:
+            db.rollback()
+        finally:
+            chunks.close()
+            try:
+                prompt = db.get(Prompt, self.prompt_id)
+                if prompt is not None:
+                    prompt.response_text = "".join(collected) or None
+                    prompt.status = final_status
+                    prompt.completed_at = datetime.utcnow()
+                    created_at = prompt.created_at
+                    db.commit()
+                    usage_stats.record_prompt_finished(created_at, final_status)
+            except Exception:
+                db.rollback()
+            finally:
+                db.close()
+            self._events.put(("done", final_status))
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+# Format: "default=rps:5,burst:10,inflight:8;gemini-2.0-flash=rps:10,burst:20,inflight:16"
+PROVIDER_LIMITS = os.getenv("PROVIDER_LIMITS", "default=rps:5,burst:10,inflight:8")
+PROVIDER_QUEUE_TIMEOUT_SECONDS = float(os.getenv("PROVIDER_QUEUE_TIMEOUT_SECONDS", "30"))
+
+
+class ProviderBusy(Exception):
+    """Raised when a caller could not get a provider slot within the queue timeout."""
+
+    def __init__(self, message: str, waited: float):
+        super().__init__(message)
+        self.waited = waited
+
+
+def user_key(user_id: int | None) -> str:
+    return str(user_id) if user_id is not None else "anonymous"
+
+
+def _parse_limits(spec: str) -> dict[str, dict[str, float]]:
+    limits: dict[str, dict[str, float]] = {}
+    for entry in spec.split(";"):
+        if "=" not in entry:
+            continue
+        model_name, options = entry.split("=", 1)
+        parsed = {}
+        for option in options.split(","):
+            if ":" not in option:
+                continue
+            name, value = option.split(":", 1)
+            try:
+                parsed[name.strip()] = float(value)
+            except ValueError:
+                continue
+        limits[model_name.strip()] = parsed
+    return limits
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `burst`; rate <= 0 means unlimited."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(time.monotonic())
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        return max((1 - self._tokens) / self.rate, 0.0)
+
+
+class ModelGate:
+    """
+    Admission control for one model: a max-in-flight cap plus a token bucket,
+    with waiting callers served round-robin across users so one heavy user
+    cannot starve the rest. All state is guarded by the condition variable.
+    """
+
+    def __init__(self, rate: float, burst: float, max_in_flight: int):
+        self._cond = threading.Condition()
+        self._bucket = TokenBucket(rate, burst)
+        self._max_in_flight = max(1, max_in_flight)
+        self._in_flight = 0
+        # user -> that user's waiting tickets; the first user is next in turn.
+        self._waiting: OrderedDict[str, deque[object]] = OrderedDict()
+        self._granted = 0
+        self._timed_out = 0
+        self._total_wait_seconds = 0.0
+
+    def _head(self) -> object | None:
+        if not self._waiting:
+            return None
+        return next(iter(self._waiting.values()))[0]
+
+    def _dequeue(self, user_key: str, ticket: object) -> None:
+        tickets = self._waiting.get(user_key)
+        if tickets is None:
+            return
+        is_head = self._head() is ticket
+        tickets.remove(ticket)
+        if not tickets:
+            del self._waiting[user_key]
+        elif is_head:
+            # This user had their turn; the next user goes first.
+            self._waiting.move_to_end(user_key)
+
+    def acquire(self, user_key: str, timeout: float) -> float:
+        """Blocks until admitted and returns the seconds spent waiting."""
+        ticket = object()
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self._waiting.setdefault(user_key, deque()).append(ticket)
+            while True:
+                now = time.monotonic()
+                if self._head() is ticket and self._in_flight < self._max_in_flight:
+                    if self._bucket.try_take():
+                        self._dequeue(user_key, ticket)
+                        self._in_flight += 1
+                        waited = now - started
+                        self._granted += 1
+                        self._total_wait_seconds += waited
+                        self._cond.notify_all()
+                        return waited
+                    wait_for = self._bucket.seconds_until_token()
+                else:
+                    wait_for = deadline - now
+                if now >= deadline:
+                    self._dequeue(user_key, ticket)
+                    self._timed_out += 1
+                    self._cond.notify_all()
+                    raise ProviderBusy("Provider is saturated", now - started)
+                self._cond.wait(min(max(wait_for, 0.001), deadline - now))
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight,
+                "rate_per_second": self._bucket.rate,
+                "burst": self._bucket.burst,
+                "waiting": sum(len(tickets) for tickets in self._waiting.values()),
+                "waiting_users": len(self._waiting),
+                "granted": self._granted,
+                "timed_out": self._timed_out,
+                "avg_wait_ms": round(self._total_wait_seconds / self._granted * 1000, 1) if self._granted else None,
+            }
+
+
+class ProviderLimiter:
+    def __init__(self, spec: str, queue_timeout: float):
+        self._limits = _parse_limits(spec)
+        self._queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._gates: dict[str, ModelGate] = {}
+
+    def gate(self, model_name: str) -> ModelGate:
+        with self._lock:
+            gate = self._gates.get(model_name)
+            if gate is None:
+                options = {**self._limits.get("default", {}), **self._limits.get(model_name, {})}
+                gate = ModelGate(
+                    rate=options.get("rps", 0.0),
+                    burst=options.get("burst", 1.0),
+                    max_in_flight=int(options.get("inflight", 8)),
+                )
+                self._gates[model_name] = gate
+            return gate
+
+    @contextmanager
+    def slot(self, model_name: str, user_id: int | None):
+        """Holds one provider slot for the block; yields the seconds spent queueing."""
+        gate = self.gate(model_name)
+        waited = gate.acquire(user_key(user_id), self._queue_timeout)
+        try:
+            yield waited
+        finally:
+            gate.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            gates = dict(self._gates)
+        return {name: gate.snapshot() for name, gate in gates.items()}
+
+
+provider_limiter = ProviderLimiter(PROVIDER_LIMITS, PROVIDER_QUEUE_TIMEOUT_SECONDS)
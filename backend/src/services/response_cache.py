@@ -0,0 +1,224 @@
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from ..database import SessionLocal
+from ..models import ResponseCacheEntry
+
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# The table is pruned every RESPONSE_CACHE_PRUNE_EVERY stores: expired rows first, then the oldest over the cap.
+RESPONSE_CACHE_MAX_DB_ROWS = int(os.getenv("RESPONSE_CACHE_MAX_DB_ROWS", "100000"))
+RESPONSE_CACHE_PRUNE_EVERY = int(os.getenv("RESPONSE_CACHE_PRUNE_EVERY", "500"))
+_PRUNE_BATCH = 500
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Only changes that cannot alter meaning: unicode form, line endings, trailing blanks.
+    text = unicodedata.normalize("NFC", prompt or "").replace("\r\n", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def cache_key(prompt: str, model_name: str) -> str:
+    material = f"{model_name}\n{normalize_prompt(prompt)}".encode("utf-8")
+    return hashlib.sha256(material).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: an in-memory LRU bounded by entry count and
+    bytes, in front of the response_cache table, which survives restarts and
+    is shared by every worker pointed at the same database.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, max_bytes: int, max_db_rows: int, prune_every: int):
+        self._ttl = timedelta(seconds=ttl_seconds)
+        self._max_entries = max(1, max_entries)
+        self._max_bytes = max(1, max_bytes)
+        self._max_db_rows = max(1, max_db_rows)
+        self._prune_every = max(1, prune_every)
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._stores_since_prune = 0
+        self._entries: OrderedDict[str, tuple[str, datetime, int]] = OrderedDict()
+        self._bytes = 0
+        self._counters = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "lru_evictions": 0,
+            "ttl_evictions": 0,
+            "db_ttl_evictions": 0,
+            "db_cap_evictions": 0,
+            "errors": 0,
+        }
+
+    def get(self, key: str) -> str | None:
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[0]
+                self._drop(key)
+                self._counters["ttl_evictions"] += 1
+
+        db = SessionLocal()
+        try:
+            row = db.get(ResponseCacheEntry, key)
+            if row is not None and row.expires_at <= now:
+                db.delete(row)
+                db.commit()
+                with self._lock:
+                    self._counters["ttl_evictions"] += 1
+                row = None
+            if row is None:
+                with self._lock:
+                    self._counters["misses"] += 1
+                return None
+            text, expires_at = row.response_text, row.expires_at
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._counters["errors"] += 1
+                self._counters["misses"] += 1
+            return None
+        finally:
+            db.close()
+
+        with self._lock:
+            self._counters["db_hits"] += 1
+            self._remember(key, text, expires_at)
+        return text
+
+    def put(self, key: str, model_name: str, text: str) -> None:
+        now = datetime.utcnow()
+        expires_at = now + self._ttl
+        with self._lock:
+            self._counters["stores"] += 1
+            self._remember(key, text, expires_at)
+            self._stores_since_prune += 1
+            prune_due = self._stores_since_prune >= self._prune_every
+            if prune_due:
+                self._stores_since_prune = 0
+
+        db = SessionLocal()
+        try:
+            db.merge(
+                ResponseCacheEntry(
+                    cache_key=key,
+                    model_name=model_name,
+                    response_text=text,
+                    created_at=now,
+                    expires_at=expires_at,
+                )
+            )
+            db.commit()
+        except Exception:
+            # Another worker may have stored the same key first; either copy is fine.
+            db.rollback()
+            with self._lock:
+                self._counters["errors"] += 1
+        finally:
+            db.close()
+        if prune_due:
+            self.prune()
+
+    def prune(self) -> None:
+        """Deletes expired rows, then the soonest-expiring rows while the table is over its row cap."""
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        db = SessionLocal()
+        try:
+            key = ResponseCacheEntry.cache_key
+            expired = self._delete_batches(
+                db, select(key).where(ResponseCacheEntry.expires_at <= datetime.utcnow())
+            )
+            over_cap = db.scalar(select(func.count()).select_from(ResponseCacheEntry)) - self._max_db_rows
+            capped = 0
+            if over_cap > 0:
+                capped = self._delete_batches(
+                    db, select(key).order_by(ResponseCacheEntry.expires_at, key), over_cap
+                )
+            with self._lock:
+                self._counters["db_ttl_evictions"] += expired
+                self._counters["db_cap_evictions"] += capped
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._counters["errors"] += 1
+        finally:
+            db.close()
+            self._prune_lock.release()
+
+    @staticmethod
+    def _delete_batches(db, keys_query, limit: int | None = None) -> int:
+        # Short transactions, so readers and writers are never blocked behind one big delete.
+        deleted = 0
+        while limit is None or deleted < limit:
+            batch = _PRUNE_BATCH if limit is None else min(_PRUNE_BATCH, limit - deleted)
+            keys = list(db.scalars(keys_query.limit(batch)))
+            if not keys:
+                break
+            db.execute(delete(ResponseCacheEntry).where(ResponseCacheEntry.cache_key.in_(keys)))
+            db.commit()
+            deleted += len(keys)
+            if len(keys) < batch:
+                break
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+            size_bytes = self._bytes
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["db_hits"]
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "memory_entries": entries,
+            "memory_bytes": size_bytes,
+            "max_entries": self._max_entries,
+            "max_bytes": self._max_bytes,
+            "max_db_rows": self._max_db_rows,
+        }
+
+    def _remember(self, key: str, text: str, expires_at: datetime) -> None:
+        # Caller holds the lock.
+        size = len(text.encode("utf-8"))
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (text, expires_at, size)
+        self._bytes += size
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._counters["lru_evictions"] += 1
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_DB_ROWS,
+    RESPONSE_CACHE_PRUNE_EVERY,
+)
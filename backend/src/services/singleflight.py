@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from typing import Any
+
+
+class FlightAbandoned(Exception):
+    """Raised to followers when the leader was cancelled before producing a result."""
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one execution.
+    The first caller (the leader) runs the function; callers that arrive while
+    it is in flight wait on the same Future and receive its result or its
+    exception. The key is released as soon as the leader finishes, so later
+    calls start a fresh execution.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, key: str) -> tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException | None = None) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if isinstance(error, asyncio.CancelledError):
+            # The leader's own cancellation is not the followers' to re-raise.
+            future.set_exception(FlightAbandoned(f"Shared call for {key!r} was cancelled"))
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float | None = None) -> tuple[Any, bool]:
+        """Returns (result, shared); shared is True when another caller did the work."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(timeout=timeout), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._finish(key, future, error=exc)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """Async form of do(); sync and async callers of one key share a flight."""
+        future, leader = self._join(key)
+        if not leader:
+            # Shielded: a follower that gets cancelled must not cancel the shared call.
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+
+        try:
+            result = await fn()
+        except BaseException as exc:
+            # Includes CancelledError, so followers are released rather than left waiting.
+            self._finish(key, future, error=exc)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "followers": self.followers,
+            }
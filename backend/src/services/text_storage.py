@@ -0,0 +1,168 @@
+import hashlib
+import os
+import zlib
+from datetime import datetime
+
+from sqlalchemy import LargeBinary, cast, event, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from ..database import engine
+from ..models import Prompt, TextBlob
+
+
+TEXT_STORAGE_ENABLED = os.getenv("TEXT_STORAGE_ENABLED", "false").lower() == "true"
+# Bodies at least this large (UTF-8 bytes) are deduplicated into text_blobs.
+TEXT_BLOB_MIN_BYTES = int(os.getenv("TEXT_BLOB_MIN_BYTES", "512"))
+TEXT_COMPRESS_LEVEL = int(os.getenv("TEXT_COMPRESS_LEVEL", "6"))
+TEXT_MIGRATE_BATCH_ROWS = int(os.getenv("TEXT_MIGRATE_BATCH_ROWS", "500"))
+FIELDS = ("prompt", "response")
+# Streaming rows rewrite their partial response every flush; they move to blobs once finished.
+UNFINISHED_STATUS = "processing"
+
+
+def encode_body(raw: bytes) -> tuple[str, bytes]:
+    compressed = zlib.compress(raw, TEXT_COMPRESS_LEVEL)
+    return ("zlib", compressed) if len(compressed) < len(raw) else ("raw", raw)
+
+
+def _insert_ignore(connection: Connection, values: dict) -> None:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        statement = sqlite_insert(TextBlob).values(**values).on_conflict_do_nothing()
+    elif dialect == "mysql":
+        # Imported here so SQLite deployments never load the MySQL dialect.
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        statement = mysql_insert(TextBlob).values(**values)
+        statement = statement.on_duplicate_key_update(digest=statement.inserted.digest)
+    else:
+        if connection.execute(select(TextBlob.digest).where(TextBlob.digest == values["digest"])).first():
+            return
+        statement = insert(TextBlob).values(**values)
+    connection.execute(statement)
+
+
+def store_blob(connection: Connection, text: str) -> str:
+    """Stores text in text_blobs unless identical content is already there; returns its digest."""
+    raw = text.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    codec, data = encode_body(raw)
+    _insert_ignore(
+        connection,
+        {
+            "digest": digest,
+            "codec": codec,
+            "data": data,
+            "original_bytes": len(raw),
+            "stored_bytes": len(data),
+            "created_at": datetime.utcnow(),
+        },
+    )
+    return digest
+
+
+def _should_externalize(text: str | None) -> bool:
+    # Cheap character-count check first; a character is at most 4 UTF-8 bytes.
+    if not text or len(text) * 4 < TEXT_BLOB_MIN_BYTES:
+        return False
+    return len(text) >= TEXT_BLOB_MIN_BYTES or len(text.encode("utf-8")) >= TEXT_BLOB_MIN_BYTES
+
+
+def _externalize_bodies(session: Session, _flush_context, _instances) -> None:
+    for instance in list(session.new) + list(session.dirty):
+        if not isinstance(instance, Prompt) or instance.status == UNFINISHED_STATUS:
+            continue
+        for field in FIELDS:
+            inline = getattr(instance, f"{field}_inline")
+            if _should_externalize(inline):
+                digest = store_blob(session.connection(), inline)
+                # The body stays readable through the instance's own copy (Prompt._body).
+                setattr(instance, f"{field}_inline", "")
+                setattr(instance, f"{field}_blob_digest", digest)
+
+
+if TEXT_STORAGE_ENABLED:
+    event.listen(Session, "before_flush", _externalize_bodies)
+
+
+def migrate_inline_bodies(batch_rows: int = TEXT_MIGRATE_BATCH_ROWS, max_batches: int | None = None) -> dict:
+    """
+    Moves existing large inline bodies into text_blobs, one committed batch at
+    a time in id order, so it can run on a live database and resume after an
+    interruption. Rows still generating are skipped and picked up on a later run.
+    """
+    table = Prompt.__table__
+    last_id = 0
+    scanned = converted = batches = 0
+    while max_batches is None or batches < max_batches:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.prompt_text, table.c.response_text)
+                .where(table.c.id > last_id, table.c.status != UNFINISHED_STATUS)
+                .order_by(table.c.id)
+                .limit(batch_rows)
+            ).all()
+            for row in rows:
+                values = {}
+                for field, text in (("prompt", row.prompt_text), ("response", row.response_text)):
+                    if _should_externalize(text):
+                        values[f"{field}_text"] = ""
+                        values[f"{field}_blob_digest"] = store_blob(connection, text)
+                if values:
+                    connection.execute(update(table).where(table.c.id == row.id).values(**values))
+                    converted += 1
+        batches += 1
+        scanned += len(rows)
+        if len(rows) < batch_rows:
+            return {"scanned": scanned, "converted": converted, "batches": batches, "done": True}
+        last_id = rows[-1].id
+    return {"scanned": scanned, "converted": converted, "batches": batches, "done": False, "last_id": last_id}
+
+
+def _byte_length(column):
+    # Cast to binary so both SQLite and MySQL count bytes, not characters.
+    return func.coalesce(func.sum(func.length(cast(column, LargeBinary))), 0)
+
+
+def storage_report() -> dict:
+    """How much the blob table saves: logical bytes referenced vs. unique vs. stored."""
+    table = Prompt.__table__
+    blobs = TextBlob.__table__
+    with engine.connect() as connection:
+        inline_bytes = connection.execute(
+            select(_byte_length(table.c.prompt_text) + _byte_length(table.c.response_text))
+        ).scalar()
+        blob_count, unique_bytes, stored_bytes = connection.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(blobs.c.original_bytes), 0),
+                func.coalesce(func.sum(blobs.c.stored_bytes), 0),
+            )
+        ).one()
+        references = logical_bytes = 0
+        for digest_column in (table.c.prompt_blob_digest, table.c.response_blob_digest):
+            count, total = connection.execute(
+                select(func.count(), func.coalesce(func.sum(blobs.c.original_bytes), 0)).select_from(
+                    table.join(blobs, blobs.c.digest == digest_column)
+                )
+            ).one()
+            references += count
+            logical_bytes += total
+
+    saved = logical_bytes - stored_bytes
+    return {
+        "enabled": TEXT_STORAGE_ENABLED,
+        "blob_min_bytes": TEXT_BLOB_MIN_BYTES,
+        "inline_bytes": int(inline_bytes),
+        "blob_references": references,
+        "blob_count": blob_count,
+        "blob_logical_bytes": int(logical_bytes),
+        "blob_unique_bytes": int(unique_bytes),
+        "blob_stored_bytes": int(stored_bytes),
+        "dedup_saved_bytes": int(logical_bytes - unique_bytes),
+        "compression_saved_bytes": int(unique_bytes - stored_bytes),
+        "saved_bytes": int(saved),
+        "saved_ratio": round(saved / logical_bytes, 3) if logical_bytes else 0.0,
+    }
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# 0 disables the cache; every request then re-verifies its token.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+
+class VerifiedTokenCache:
+    """
+    LRU of tokens whose signature already checked out, mapped to their
+    decoded payload. Keyed by the whole token, so an altered header or
+    payload never matches; entries are only served until the token's exp.
+    """
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "expired": 0, "lru_evictions": 0}
+
+    def get(self, token: str) -> dict | None:
+        if self._max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                if entry[1] >= time.time():
+                    self._entries.move_to_end(token)
+                    self._counters["hits"] += 1
+                    return entry[0]
+                del self._entries[token]
+                self._counters["expired"] += 1
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, token: str, payload: dict, expires_at: int) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (payload, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._counters["lru_evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self._max_entries > 0,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+            "entries": entries,
+            "max_entries": self._max_entries,
+        }
+
+
+token_cache = VerifiedTokenCache(AUTH_TOKEN_CACHE_SIZE)
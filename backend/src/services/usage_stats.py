@@ -0,0 +1,289 @@
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal_column, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+from ..database import engine
+from ..models import ModelLatencyRollup, Prompt, PromptRollup, UsageTotal, User
+from .model_registry import LATENCY_BUCKETS_MS, LatencyHistogram
+
+
+STATS_FLUSH_SECONDS = float(os.getenv("STATS_FLUSH_SECONDS", "5"))
+GRANULARITIES = ("hour", "day")
+OPEN_BUCKET_MS = -1
+_BUCKETS = LatencyHistogram(LATENCY_BUCKETS_MS)
+# Rows still generating are counted in the totals but not in the status rollups.
+UNFINISHED_STATUS = "processing"
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_bound(index: int) -> int:
+    return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else OPEN_BUCKET_MS
+
+
+def _bound_index(le_ms: int) -> int:
+    return LATENCY_BUCKETS_MS.index(le_ms) if le_ms in LATENCY_BUCKETS_MS else len(LATENCY_BUCKETS_MS)
+
+
+def _increment(connection: Connection, table, key: dict, column: str, delta: int) -> None:
+    # Portable upsert: bump the row, insert it if it was not there yet.
+    bump = update(table).where(*[table.c[name] == value for name, value in key.items()])
+    bump = bump.values({column: table.c[column] + delta})
+    if connection.execute(bump).rowcount:
+        return
+    try:
+        connection.execute(insert(table).values(**key, **{column: delta}))
+    except IntegrityError:
+        # Another worker process inserted the row first; MySQL keeps the transaction open.
+        connection.execute(bump)
+
+
+def _hour_bucket_expr(dialect_name: str):
+    column = Prompt.__table__.c.created_at
+    if dialect_name == "mysql":
+        return func.date_format(column, literal_column("'%Y-%m-%d %H:00:00'"))
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def raw_counts(connection: Connection) -> tuple[dict[str, int], Counter]:
+    """Totals and (granularity, bucket, status) counts computed from the raw tables."""
+    totals = {
+        "users": connection.execute(select(func.count()).select_from(User.__table__)).scalar() or 0,
+        "prompts": connection.execute(select(func.count()).select_from(Prompt.__table__)).scalar() or 0,
+    }
+    hour = _hour_bucket_expr(connection.dialect.name).label("hour")
+    rows = connection.execute(
+        select(hour, Prompt.__table__.c.status, func.count().label("count"))
+        .where(Prompt.__table__.c.status != UNFINISHED_STATUS)
+        .group_by(hour, Prompt.__table__.c.status)
+    )
+    buckets: Counter = Counter()
+    for row in rows:
+        started = _as_datetime(row.hour)
+        for granularity in GRANULARITIES:
+            buckets[(granularity, bucket_start(started, granularity), row.status)] += row.count
+    return totals, buckets
+
+
+def stored_counts(connection: Connection) -> tuple[dict[str, int], Counter]:
+    totals = {row.name: row.value for row in connection.execute(select(UsageTotal.__table__))}
+    buckets: Counter = Counter()
+    for row in connection.execute(select(PromptRollup.__table__)):
+        buckets[(row.granularity, row.bucket_start, row.status)] += row.count
+    return {"users": totals.get("users", 0), "prompts": totals.get("prompts", 0)}, buckets
+
+
+def rebuild_rollups(connection: Connection) -> None:
+    """Rewrites totals and prompt rollups from the raw tables. Latency rollups have no raw source and are kept."""
+    totals, buckets = raw_counts(connection)
+    connection.execute(delete(UsageTotal.__table__))
+    connection.execute(delete(PromptRollup.__table__))
+    connection.execute(
+        insert(UsageTotal.__table__),
+        [{"name": name, "value": value} for name, value in totals.items()],
+    )
+    if buckets:
+        connection.execute(
+            insert(PromptRollup.__table__),
+            [
+                {"granularity": granularity, "bucket_start": started, "status": status, "count": count}
+                for (granularity, started, status), count in buckets.items()
+            ],
+        )
+
+
+class UsageStats:
+    """
+    Admin dashboard counters kept as rollup tables instead of COUNT(*) scans.
+    Writers record deltas in memory; a compactor thread folds them into the
+    rollups every STATS_FLUSH_SECONDS, so request paths never touch these tables.
+    Deltas not yet flushed are lost on a crash; reconcile() detects and repairs that.
+    """
+
+    def __init__(self, flush_seconds: float):
+        self._flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        # Serializes flushes with each other and with rebuilds.
+        self._flush_lock = threading.Lock()
+        self._totals: Counter = Counter()
+        self._prompts: Counter = Counter()
+        self._latency: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def record_user(self) -> None:
+        with self._lock:
+            self._totals["users"] += 1
+
+    def record_prompts_created(self, count: int = 1) -> None:
+        with self._lock:
+            self._totals["prompts"] += count
+
+    def record_prompt_deleted(self, created_at: datetime, status: str) -> None:
+        with self._lock:
+            self._totals["prompts"] -= 1
+            if status != UNFINISHED_STATUS:
+                for granularity in GRANULARITIES:
+                    self._prompts[(granularity, bucket_start(created_at, granularity), status)] -= 1
+
+    def record_prompt_finished(self, created_at: datetime, status: str) -> None:
+        with self._lock:
+            for granularity in GRANULARITIES:
+                self._prompts[(granularity, bucket_start(created_at, granularity), status)] += 1
+
+    def record_latency(self, model_name: str, latency_seconds: float) -> None:
+        le_ms = _bucket_bound(_BUCKETS.bucket_index(latency_seconds * 1000))
+        key = (bucket_start(datetime.utcnow(), "hour"), model_name, le_ms)
+        with self._lock:
+            self._latency[key] += 1
+
+    def pending_totals(self) -> dict[str, int]:
+        """This process's unflushed total deltas, so the overview is not a flush interval behind."""
+        with self._lock:
+            return dict(self._totals)
+
+    def _take(self) -> tuple[Counter, Counter, Counter]:
+        with self._lock:
+            taken = (self._totals, self._prompts, self._latency)
+            self._totals, self._prompts, self._latency = Counter(), Counter(), Counter()
+        return taken
+
+    def _restore(self, totals: Counter, prompts: Counter, latency: Counter) -> None:
+        with self._lock:
+            self._totals.update(totals)
+            self._prompts.update(prompts)
+            self._latency.update(latency)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            totals, prompts, latency = self._take()
+            if not any(totals.values()) and not any(prompts.values()) and not latency:
+                return
+            try:
+                with engine.begin() as connection:
+                    for name, delta in totals.items():
+                        if delta:
+                            _increment(connection, UsageTotal.__table__, {"name": name}, "value", delta)
+                    for (granularity, started, status), delta in prompts.items():
+                        if delta:
+                            _increment(
+                                connection,
+                                PromptRollup.__table__,
+                                {"granularity": granularity, "bucket_start": started, "status": status},
+                                "count",
+                                delta,
+                            )
+                    for (started, model_name, le_ms), delta in latency.items():
+                        _increment(
+                            connection,
+                            ModelLatencyRollup.__table__,
+                            {"bucket_start": started, "model_name": model_name, "le_ms": le_ms},
+                            "count",
+                            delta,
+                        )
+            except Exception:
+                # Keep the deltas for the next pass rather than dropping them.
+                self.flush_errors += 1
+                self._restore(totals, prompts, latency)
+                raise
+            self.flushes += 1
+
+    def reconcile(self, repair: bool = False) -> dict:
+        """Compares the rollups with raw counts; with repair, rebuilds them from the raw tables."""
+        self.flush()
+        with self._flush_lock:
+            with engine.begin() as connection:
+                raw_totals, raw_buckets = raw_counts(connection)
+                rollup_totals, rollup_buckets = stored_counts(connection)
+                mismatches = []
+                for key in sorted(set(raw_buckets) | set(rollup_buckets)):
+                    if raw_buckets.get(key, 0) == rollup_buckets.get(key, 0):
+                        continue
+                    granularity, started, status = key
+                    mismatches.append(
+                        {
+                            "granularity": granularity,
+                            "bucket_start": started,
+                            "status": status,
+                            "raw": raw_buckets.get(key, 0),
+                            "rollup": rollup_buckets.get(key, 0),
+                        }
+                    )
+                consistent = raw_totals == rollup_totals and not mismatches
+                if repair and not consistent:
+                    # Local count deltas are already in the raw rows being counted.
+                    _, _, latency = self._take()
+                    self._restore(Counter(), Counter(), latency)
+                    rebuild_rollups(connection)
+        return {
+            "consistent": consistent,
+            "repaired": repair and not consistent,
+            "totals": {
+                name: {"raw": raw_totals[name], "rollup": rollup_totals[name]} for name in raw_totals
+            },
+            "mismatched_buckets": mismatches[:100],
+            "mismatched_bucket_count": len(mismatches),
+        }
+
+    def start(self) -> None:
+        if self._thread is not None or self._flush_seconds <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._compactor_loop, name="usage-stats", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=5.0)
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _compactor_loop(self) -> None:
+        while not self._stop.wait(self._flush_seconds):
+            try:
+                self.flush()
+            except Exception:
+                continue
+
+
+def latency_percentiles(rows) -> dict[str, dict]:
+    """Per-model count and p50/p95/p99 from ModelLatencyRollup rows."""
+    histograms: dict[str, LatencyHistogram] = {}
+    for row in rows:
+        histogram = histograms.setdefault(row.model_name, LatencyHistogram(LATENCY_BUCKETS_MS))
+        histogram.add(_bound_index(row.le_ms), row.count)
+    return {
+        model_name: {
+            "count": histogram.count,
+            "p50_ms": histogram.percentile(0.5),
+            "p95_ms": histogram.percentile(0.95),
+            "p99_ms": histogram.percentile(0.99),
+        }
+        for model_name, histogram in sorted(histograms.items())
+    }
+
+
+def default_window(granularity: str) -> timedelta:
+    return timedelta(hours=48) if granularity == "hour" else timedelta(days=30)
+
+
+usage_stats = UsageStats(STATS_FLUSH_SECONDS)
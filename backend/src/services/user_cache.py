@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from ..models import User
+
+
+AUTH_USER_CACHE_ENABLED = os.getenv("AUTH_USER_CACHE_ENABLED", "true").lower() == "true"
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+# Upper bound on staleness for changes made outside this process (other workers, manual SQL).
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+_PENDING_KEY = "user_cache_pending"
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """The authenticated caller as routes see it; detached from any session."""
+
+    id: int
+    name: str
+    email: str
+    created_at: datetime
+    is_admin: bool
+
+
+class UserCache:
+    """
+    Bounded LRU of user identities keyed by id, each entry expiring after a
+    TTL. Users changed through the ORM are invalidated at flush and again at
+    commit; use invalidate() after bulk UPDATE/DELETE statements on users.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, enabled: bool = True):
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[CachedUser, float]] = OrderedDict()
+        # Bumped by every invalidation so a lookup that raced one does not store what it read.
+        self._generation = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "stale_stores_skipped": 0,
+            "invalidations": 0,
+            "lru_evictions": 0,
+            "ttl_evictions": 0,
+        }
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: int) -> CachedUser | None:
+        if not self._enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    self._counters["hits"] += 1
+                    return entry[0]
+                del self._entries[user_id]
+                self._counters["ttl_evictions"] += 1
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, user: CachedUser, generation: int | None = None) -> None:
+        """Stores user; pass the generation read before loading it to skip the store if it may be stale."""
+        if not self._enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._counters["stale_stores_skipped"] += 1
+                return
+            self._entries[user.id] = (user, time.monotonic() + self._ttl)
+            self._entries.move_to_end(user.id)
+            self._counters["stores"] += 1
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._counters["lru_evictions"] += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._counters["invalidations"] += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self._enabled,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else None,
+            "entries": entries,
+            "max_entries": self._max_entries,
+            "ttl_seconds": self._ttl,
+        }
+
+
+user_cache = UserCache(AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_ENABLED)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(_mapper, _connection, target: User) -> None:
+    user_cache.invalidate(target.id)
+    # A request reading between this flush and the commit still sees the old row; drop it again then.
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session) -> None:
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+
+# Settings are read at import time, so they must be in place before src is imported.
+_TMP_DIR = tempfile.mkdtemp(prefix="taskmate-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP_DIR}/test.db")
+os.environ["GEMINI_API_KEY"] = ""
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+from google.genai import types
+
+from src.agent import agent_core
+
+
+def _call(name, **args):
+    return types.FunctionCall(name=name, args=args)
+
+
+@pytest.fixture(autouse=True)
+def calculator_dir(tmp_path, monkeypatch):
+    # Paths are resolved against the relative "calculator" working directory.
+    (tmp_path / "calculator").mkdir()
+    for name in ("a.py", "b.py", "c.py", "d.py", "e.py"):
+        (tmp_path / "calculator" / name).write_text(f"# {name}\n")
+    monkeypatch.chdir(tmp_path)
+
+
+def test_distinct_reads_form_one_wave():
+    calls = [_call("get_file_content", file_path=name) for name in ("a.py", "b.py", "c.py", "d.py", "e.py")]
+    assert agent_core.plan_tool_waves(calls) == [[0, 1, 2, 3, 4]]
+
+
+def test_reads_of_the_same_path_are_serialized():
+    calls = [
+        _call("get_file_content", file_path="a.py"),
+        _call("get_file_content", file_path="b.py"),
+        _call("get_file_content", file_path="a.py"),
+    ]
+    assert agent_core.plan_tool_waves(calls) == [[0, 1], [2]]
+
+
+def test_write_is_isolated_and_keeps_its_position():
+    calls = [
+        _call("get_file_content", file_path="a.py"),
+        _call("get_file_content", file_path="b.py"),
+        _call("write_file", file_path="c.py", content="x = 1\n"),
+        _call("get_file_content", file_path="c.py"),
+        _call("get_file_content", file_path="d.py"),
+    ]
+    assert agent_core.plan_tool_waves(calls) == [[0, 1], [2], [3, 4]]
+
+
+def test_results_and_output_come_back_in_call_order(monkeypatch, capsys):
+    started = threading.Barrier(3)
+    # Later calls finish first.
+    delays = {"a.py": 0.3, "b.py": 0.2, "c.py": 0.1}
+
+    def fake_call_function(function_call_part, verbose=False, out=None):
+        if function_call_part.name == "get_file_content":
+            started.wait(timeout=5)
+            time.sleep(delays[function_call_part.args["file_path"]])
+        print(f"log {function_call_part.args['file_path']}", file=out)
+        return function_call_part.args["file_path"]
+
+    monkeypatch.setattr(agent_core, "call_function", fake_call_function)
+    calls = [
+        _call("get_file_content", file_path="a.py"),
+        _call("get_file_content", file_path="b.py"),
+        _call("get_file_content", file_path="c.py"),
+        _call("write_file", file_path="d.py", content=""),
+    ]
+    with agent_core.ThreadPoolExecutor(max_workers=3) as executor:
+        results, waves = agent_core.run_tool_calls(calls, executor)
+
+    assert results == ["a.py", "b.py", "c.py", "d.py"]
+    assert waves == 2
+    assert capsys.readouterr().out.split("\n")[:4] == ["log a.py", "log b.py", "log c.py", "log d.py"]
@@ -0,0 +1,35 @@
+import pytest
+
+from src.services.auth_limits import AttemptStore, AuthRateLimited, AuthRateLimiter, SqliteAttemptStore
+
+
+def _limiter(path: str, per_email: int) -> AuthRateLimiter:
+    return AuthRateLimiter(SqliteAttemptStore(path), window_seconds=3600, per_email=per_email, per_ip=1000)
+
+
+def test_attempt_store_is_abstract():
+    with pytest.raises(TypeError):
+        AttemptStore()
+
+
+def test_limiters_sharing_a_sqlite_file_share_one_limit(tmp_path):
+    # Two limiter instances stand in for two worker processes on one host.
+    path = str(tmp_path / "limits.db")
+    first, second = _limiter(path, per_email=4), _limiter(path, per_email=4)
+
+    first.check("login", "shared@example.com", "10.0.0.1")
+    second.check("login", "shared@example.com", "10.0.0.2")
+    first.check("login", "shared@example.com", "10.0.0.1")
+    second.check("login", "shared@example.com", "10.0.0.2")
+
+    for limiter in (first, second):
+        with pytest.raises(AuthRateLimited) as rejected:
+            limiter.check("login", "shared@example.com", "10.0.0.3")
+        assert rejected.value.scope == "email"
+        assert rejected.value.retry_after >= 1
+
+    # Other emails keep their own budget.
+    second.check("login", "other@example.com", "10.0.0.2")
+    occupancy = first.stats()["occupancy"]["email"]
+    assert occupancy["tracked_keys"] == 2
+    assert occupancy["over_limit"] == 1
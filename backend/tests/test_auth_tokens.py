@@ -0,0 +1,51 @@
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.api import auth
+
+
+def _token(header, payload, key: bytes) -> str:
+    encoded_header = auth._b64url_encode(json.dumps(header).encode("utf-8"))
+    encoded_payload = auth._b64url_encode(json.dumps(payload).encode("utf-8"))
+    signature = hmac.new(key, f"{encoded_header}.{encoded_payload}".encode("utf-8"), hashlib.sha256).digest()
+    return f"{encoded_header}.{encoded_payload}.{auth._b64url_encode(signature)}"
+
+
+def _claims() -> dict:
+    return {"sub": "1", "exp": int(time.time()) + 60}
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "not-a-token",
+        _token([], _claims(), b"k"),
+        _token("header", _claims(), b"k"),
+        _token({"alg": "HS256", "kid": ["a"]}, _claims(), b"k"),
+        _token({"alg": "HS256", "kid": 1}, _claims(), b"k"),
+        _token({"alg": "HS256", "kid": "nope"}, _claims(), b"k"),
+        _token({"alg": "HS256", "kid": auth.ACTIVE_KID}, [], auth.AUTH_SIGNING_KEYS[auth.ACTIVE_KID]),
+        _token({"alg": "HS256", "kid": auth.ACTIVE_KID}, {"exp": "soon"}, auth.AUTH_SIGNING_KEYS[auth.ACTIVE_KID]),
+        _token({"alg": "HS256", "kid": auth.ACTIVE_KID}, _claims(), auth.AUTH_SIGNING_KEYS[auth.ACTIVE_KID])[:-3] + "!!!",
+    ],
+)
+def test_malformed_tokens_are_unauthorized(token):
+    with pytest.raises(HTTPException) as rejected:
+        auth.decode_token(token)
+    assert rejected.value.status_code == 401
+
+
+def test_legacy_tokens_are_refused_once_switched_off(monkeypatch):
+    secret = b"legacy-secret"
+    monkeypatch.setattr(auth, "LEGACY_SIGNING_KEY", secret)
+    assert auth.decode_token(_token({"alg": "HS256"}, _claims(), secret))["sub"] == "1"
+
+    monkeypatch.setattr(auth, "LEGACY_SIGNING_KEY", None)
+    with pytest.raises(HTTPException) as rejected:
+        auth.decode_token(_token({"alg": "HS256"}, {**_claims(), "sub": "2"}, secret))
+    assert rejected.value.detail == "Unknown token signing key"
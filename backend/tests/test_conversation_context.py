@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from app import app
+
+
+def test_local_fallback_replies_do_not_feed_back_into_context():
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/auth/register",
+            json={"name": "Context", "email": "context@example.com", "password": "password123"},
+        )
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        session_id = client.post("/api/sessions", json={"title": "s"}, headers=headers).json()["id"]
+
+        replies = []
+        for prompt in ("first question", "second question", "third question"):
+            body = client.post("/api/prompts", json={"session_id": session_id, "prompt": prompt}, headers=headers).json()
+            assert body["status"] == "local_fallback"
+            replies.append(body["response_text"])
+
+    assert replies[-1] == "[Local fallback] I received your prompt: third question"
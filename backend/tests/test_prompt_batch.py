@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from src.database import SessionLocal, init_db
+from src.models import Prompt, User
+from src.schemas import PromptResponse
+from src.services import prompt_batch
+
+
+def test_interrupt_counts_only_rows_still_processing(monkeypatch):
+    init_db()
+    with SessionLocal() as db:
+        user = User(name="Batch", email="batch-interrupt@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        prompts = [
+            Prompt(user_id=user.id, prompt_text=f"p{index}", status="processing", created_at=datetime.utcnow())
+            for index in range(3)
+        ]
+        db.add_all(prompts)
+        db.commit()
+        rows = [PromptResponse.model_validate(prompt) for prompt in prompts]
+        # One row finished and one was deleted before the batch was cancelled.
+        prompts[0].status = "completed"
+        db.delete(prompts[1])
+        db.commit()
+
+    finished = []
+    monkeypatch.setattr(
+        prompt_batch.usage_stats, "record_prompt_finished", lambda created_at, status: finished.append(status)
+    )
+    prompt_batch._interrupt(rows)
+
+    assert finished == ["interrupted"]
+    with SessionLocal() as db:
+        assert db.get(Prompt, rows[0].id).status == "completed"
+        assert db.get(Prompt, rows[1].id) is None
+        assert db.get(Prompt, rows[2].id).status == "interrupted"
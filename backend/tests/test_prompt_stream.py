@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+from app import app
+
+
+def test_resume_hides_prompts_in_deleted_sessions():
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/auth/register",
+            json={"name": "Stream", "email": "stream-resume@example.com", "password": "password123"},
+        )
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        session_id = client.post("/api/sessions", json={"title": "s"}, headers=headers).json()["id"]
+        prompt_id = client.post(
+            "/api/prompts", json={"session_id": session_id, "prompt": "hello"}, headers=headers
+        ).json()["id"]
+        assert client.get(f"/api/prompts/{prompt_id}/stream", headers=headers).status_code == 200
+
+        client.delete(f"/api/sessions/{session_id}", headers=headers)
+
+        assert client.get(f"/api/prompts/{prompt_id}", headers=headers).status_code == 404
+        assert client.get(f"/api/prompts/{prompt_id}/stream", headers=headers).status_code == 404
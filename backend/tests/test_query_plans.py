@@ -0,0 +1,22 @@
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.query_plans import hot_queries, plan_problems, seed
+from src.migrations import run_migrations
+
+
+@pytest.fixture(scope="module")
+def plan_connection(tmp_path_factory):
+    # Its own file: the seed uses fixed ids and a skewed tenant, unlike the shared test database.
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans')}/plans.db")
+    run_migrations(engine)
+    seed(engine, users=200, sessions_per_user=20, prompts_per_session=40)
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", sorted(hot_queries()))
+def test_hot_query_reads_through_an_index_without_sorting(plan_connection, name):
+    plan, problems = plan_problems(plan_connection, hot_queries()[name])
+    assert not problems, "\n".join(plan)
@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from src import database
+from src.migrations import run_migrations
+
+
+@pytest.fixture
+def lagging_replica(tmp_path, monkeypatch):
+    # An empty copy of the schema that is never synced: any row written through the primary is missing here.
+    replica = database.ReadReplica(0, f"sqlite:///{tmp_path}/replica.db")
+    run_migrations(replica.engine)
+    monkeypatch.setattr(database, "read_replicas", [replica])
+    yield replica
+    replica.engine.dispose()
+
+
+def _create_session(client, email: str, sticky_seconds: float, monkeypatch) -> tuple[dict, int]:
+    monkeypatch.setattr(database, "read_your_writes", database.ReadYourWrites(sticky_seconds))
+    response = client.post(
+        "/api/auth/register",
+        json={"name": "Replica", "email": email, "password": "password123"},
+    )
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    created = client.post("/api/sessions", json={"title": "fresh"}, headers=headers)
+    assert created.status_code == 200
+    return headers, created.json()["id"]
+
+
+def test_reads_after_a_write_see_the_write(lagging_replica, monkeypatch):
+    with TestClient(app) as client:
+        headers, session_id = _create_session(client, "ryw@example.com", 60, monkeypatch)
+        listed = client.get("/api/sessions", headers=headers)
+
+    assert session_id in [session["id"] for session in listed.json()]
+    assert lagging_replica.reads == 0
+
+
+def test_reads_outside_the_window_go_to_the_replica(lagging_replica, monkeypatch):
+    with TestClient(app) as client:
+        headers, session_id = _create_session(client, "replica-read@example.com", 0, monkeypatch)
+        listed = client.get("/api/sessions", headers=headers)
+
+    assert session_id not in [session["id"] for session in listed.json()]
+    assert lagging_replica.reads == 1
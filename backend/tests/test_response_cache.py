@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from src.database import SessionLocal, init_db
+from src.models import ResponseCacheEntry
+from src.services.response_cache import ResponseCache
+
+
+def test_stores_prune_expired_rows_and_cap_the_table():
+    init_db()
+    with SessionLocal() as db:
+        db.execute(delete(ResponseCacheEntry))
+        db.add(
+            ResponseCacheEntry(
+                cache_key="expired",
+                model_name="m",
+                response_text="old",
+                created_at=datetime.utcnow() - timedelta(days=2),
+                expires_at=datetime.utcnow() - timedelta(days=1),
+            )
+        )
+        db.commit()
+
+    cache = ResponseCache(ttl_seconds=3600, max_entries=10, max_bytes=1024, max_db_rows=3, prune_every=5)
+    for index in range(5):
+        cache.put(f"key-{index}", "m", f"text {index}")
+
+    with SessionLocal() as db:
+        assert sorted(db.scalars(select(ResponseCacheEntry.cache_key))) == ["key-2", "key-3", "key-4"]
+    stats = cache.stats()
+    assert stats["db_ttl_evictions"] == 1
+    assert stats["db_cap_evictions"] == 2
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from src.services.singleflight import SingleFlight
+
+
+CALLERS = 16
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = 0
+    calls_lock = threading.Lock()
+    all_joined = threading.Barrier(CALLERS)
+    results = []
+    results_lock = threading.Lock()
+
+    def upstream():
+        nonlocal calls
+        with calls_lock:
+            calls += 1
+        # Stay in flight long enough for every caller to join.
+        time.sleep(0.2)
+        return object()
+
+    def caller():
+        all_joined.wait()
+        result, shared = flights.do("key", upstream, timeout=5)
+        with results_lock:
+            results.append((result, shared))
+
+    threads = [threading.Thread(target=caller) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert calls == 1
+    assert len(results) == CALLERS
+    assert len({id(result) for result, _ in results}) == 1
+    assert sum(not shared for _, shared in results) == 1
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "followers": CALLERS - 1}
+
+
+def test_followers_receive_the_leaders_exception():
+    flights = SingleFlight()
+    leader_started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def upstream():
+        leader_started.set()
+        release.wait(5)
+        raise RuntimeError("upstream failed")
+
+    def caller():
+        try:
+            flights.do("key", upstream, timeout=5)
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    leader_started.wait(5)
+    followers = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flights.stats()["followers"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(timeout=5)
+
+    assert len(errors) == 4
+    assert len({id(error) for error in errors}) == 1
+
+
+def test_key_is_released_after_the_call():
+    flights = SingleFlight()
+    assert flights.do("key", lambda: 1) == (1, False)
+    assert flights.do("key", lambda: 2) == (2, False)
+    with pytest.raises(ValueError):
+        flights.do("key", lambda: int("x"))
+    assert flights.stats()["in_flight"] == 0